@@ -1,8 +1,25 @@
+import bisect
+import io
+import itertools
 import os
 import struct
+import tempfile
 import hashlib
+import heapq
+import hmac
 import math
-from typing import List, Tuple, Optional
+import mmap
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Tuple, Optional
+
+try:
+    import numpy as np
+except ImportError:  # 没有 NumPy 时批量接口退化为逐条计算
+    np = None
+
+_unpack_16I = struct.Struct('>16I').unpack
 
 
 # ====================== a) SM3 优化实现 ======================
@@ -16,36 +33,85 @@ class SM3:
     # 常量表
     T = [0x79cc4519] * 16 + [0x7a879d8a] * 48
 
-    @staticmethod
-    def _left_rotate(x: int, n: int) -> int:
-        """循环左移"""
-        return ((x << (n % 32)) & 0xFFFFFFFF) | (x >> (32 - (n % 32)))
-
-    @staticmethod
-    def _ff(x: int, y: int, z: int, j: int) -> int:
-        """布尔函数 FF"""
-        if j < 16:
-            return x ^ y ^ z
-        else:
-            return (x & y) | (x & z) | (y & z)
+    # 预计算的轮常量 T_j <<< j (避免每轮做一次循环移位)
+    T_ROT = [((t << (j % 32)) | (t >> (32 - j % 32))) & 0xFFFFFFFF for j, t in enumerate(T)]
 
-    @staticmethod
-    def _gg(x: int, y: int, z: int, j: int) -> int:
-        """布尔函数 GG"""
-        if j < 16:
-            return x ^ y ^ z
-        else:
-            return (x & y) | (~x & z)
+    # hashlib 兼容属性
+    name = 'sm3'
+    digest_size = 32
+    block_size = 64
 
-    @staticmethod
-    def _p0(x: int) -> int:
-        """置换函数 P0"""
-        return x ^ SM3._left_rotate(x, 9) ^ SM3._left_rotate(x, 17)
+    def __init__(self, data: bytes = b''):
+        """
+        流式 SM3 哈希对象 (接口与 hashlib 一致)
+        :param data: 可选的初始数据
+        """
+        self._v = SM3.IV.copy()   # 当前链接状态
+        self._buf = b''           # 未满 64 字节的剩余数据
+        self._count = 0           # 已输入的总字节数
+        if data:
+            self.update(data)
+
+    def update(self, data: bytes) -> None:
+        """追加数据, 只缓存不足一个分组的尾部"""
+        mv = memoryview(data).cast('B')
+        n = len(mv)
+        self._count += n
+        pos = 0
+
+        # 先补齐上次剩余的不完整分组
+        if self._buf:
+            need = 64 - len(self._buf)
+            if n < need:
+                self._buf += bytes(mv)
+                return
+            self._v = SM3._compress(self._v, self._buf + bytes(mv[:need]))
+            pos = need
+
+        # 直接在输入缓冲区上处理完整分组, 不做拷贝
+        v = self._v
+        end = n - (n - pos) % 64
+        for i in range(pos, end, 64):
+            v = SM3._compress(v, mv[i:i + 64])
+        self._v = v
+        self._buf = bytes(mv[end:])
+
+    def digest(self) -> bytes:
+        """返回当前摘要 (不改变对象状态, 可继续 update)"""
+        length = self._count
+        tail = self._buf + b'\x80' + b'\x00' * ((55 - length) % 64) + struct.pack('>Q', length * 8)
+        v = self._v
+        for i in range(0, len(tail), 64):
+            v = SM3._compress(v, tail[i:i + 64])
+        return struct.pack('>8I', *v)
+
+    def hexdigest(self) -> str:
+        """返回十六进制摘要"""
+        return self.digest().hex()
 
     @staticmethod
-    def _p1(x: int) -> int:
-        """置换函数 P1"""
-        return x ^ SM3._left_rotate(x, 15) ^ SM3._left_rotate(x, 23)
+    def resume(state: bytes, length: int) -> 'SM3':
+        """
+        从任意链接状态继续计算
+        :param state: 32 字节链接状态 (例如某条消息的哈希值)
+        :param length: 该状态已处理的字节数, 必须是 64 的倍数
+        :return: 可继续 update 的哈希对象
+        """
+        if length % 64:
+            raise ValueError("length must be a multiple of the block size")
+        h = SM3.__new__(SM3)
+        h._v = list(struct.unpack('>8I', state))
+        h._buf = b''
+        h._count = length
+        return h
+
+    def copy(self) -> 'SM3':
+        """复制当前状态, 用于复用公共前缀"""
+        other = SM3.__new__(SM3)
+        other._v = self._v.copy()
+        other._buf = self._buf
+        other._count = self._count
+        return other
 
     @staticmethod
     def _padding(msg: bytes) -> bytes:
@@ -58,48 +124,359 @@ class SM3:
 
     @staticmethod
     def _compress(iv: list, block: bytes) -> list:
-        """压缩函数 (优化版)"""
-        # 消息扩展
-        w = list(struct.unpack('>16I', block))
+        """
+        压缩函数 (优化版)
+        - 轮常量移位结果查表
+        - 0~15 轮与 16~63 轮拆成两个循环, 布尔函数与移位全部内联
+        - 预先计算 W'_j = W_j ^ W_{j+4}
+        """
+        M = 0xFFFFFFFF
+
+        # 消息扩展 (P1 与循环移位内联, 左移部分合并后统一截断)
+        w = list(_unpack_16I(block))
+        append = w.append
         for j in range(16, 68):
-            w.append(SM3._p1(w[j - 16] ^ w[j - 9] ^ SM3._left_rotate(w[j - 3], 15)) ^
-                     SM3._left_rotate(w[j - 13], 7) ^ w[j - 6])
+            x = w[j - 3]
+            x = w[j - 16] ^ w[j - 9] ^ (((x << 15) | (x >> 17)) & M)
+            y = w[j - 13]
+            append(x ^ (((x << 15) ^ (x << 23)) & M) ^ (x >> 17) ^ (x >> 9) ^
+                   (((y << 7) | (y >> 25)) & M) ^ w[j - 6])
+        w1 = [x ^ y for x, y in zip(w, w[4:68])]
 
         # 初始化寄存器
         a, b, c, d, e, f, g, h = iv
-
-        # 主循环
-        for j in range(64):
-            ss1 = SM3._left_rotate((SM3._left_rotate(a, 12) + e + SM3._left_rotate(SM3.T[j], j)) & 0xFFFFFFFF, 7)
-            ss2 = ss1 ^ SM3._left_rotate(a, 12)
-            tt1 = (SM3._ff(a, b, c, j) + d + ss2 + (w[j] if j < 16 else w[j] ^ w[j - 4])) & 0xFFFFFFFF
-            tt2 = (SM3._gg(e, f, g, j) + h + ss1 + w[j]) & 0xFFFFFFFF
+        t_rot = SM3.T_ROT
+
+        # 第 0~15 轮: FF = GG = X ^ Y ^ Z
+        for tj, wj, w1j in zip(t_rot[:16], w, w1):
+            a12 = ((a << 12) | (a >> 20)) & M
+            ss1 = (a12 + e + tj) & M
+            ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+            tt1 = ((a ^ b ^ c) + d + (ss1 ^ a12) + w1j) & M
+            tt2 = ((e ^ f ^ g) + h + ss1 + wj) & M
             d = c
-            c = SM3._left_rotate(b, 9)
+            c = ((b << 9) | (b >> 23)) & M
             b = a
             a = tt1
             h = g
-            g = SM3._left_rotate(f, 19)
+            g = ((f << 19) | (f >> 13)) & M
             f = e
-            e = SM3._p0(tt2)
+            e = tt2 ^ (((tt2 << 9) ^ (tt2 << 17)) & M) ^ (tt2 >> 23) ^ (tt2 >> 15)
+
+        # 第 16~63 轮: FF 为多数函数, GG 为选择函数
+        for tj, wj, w1j in zip(t_rot[16:], w[16:64], w1[16:]):
+            a12 = ((a << 12) | (a >> 20)) & M
+            ss1 = (a12 + e + tj) & M
+            ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+            tt1 = (((a & (b | c)) | (b & c)) + d + (ss1 ^ a12) + w1j) & M
+            tt2 = ((g ^ (e & (f ^ g))) + h + ss1 + wj) & M
+            d = c
+            c = ((b << 9) | (b >> 23)) & M
+            b = a
+            a = tt1
+            h = g
+            g = ((f << 19) | (f >> 13)) & M
+            f = e
+            e = tt2 ^ (((tt2 << 9) ^ (tt2 << 17)) & M) ^ (tt2 >> 23) ^ (tt2 >> 15)
 
         # 更新IV
-        return [(iv[i] ^ reg) & 0xFFFFFFFF for i, reg in enumerate([a, b, c, d, e, f, g, h])]
+        return [iv[0] ^ a, iv[1] ^ b, iv[2] ^ c, iv[3] ^ d,
+                iv[4] ^ e, iv[5] ^ f, iv[6] ^ g, iv[7] ^ h]
 
     @staticmethod
     def hash(msg: bytes) -> bytes:
-        """SM3 哈希函数 (优化版)"""
-        # 填充消息
-        padded_msg = SM3._padding(msg)
+        """SM3 哈希函数 (优化版, 只在最后一个分组做填充, 不复制整条消息)"""
+        return SM3(msg).digest()
+
+    @staticmethod
+    def hash_file(source, chunk_size: int = 1 << 20) -> bytes:
+        """
+        分块计算文件的 SM3 哈希 (常数内存)
+        :param source: 文件路径或二进制文件对象
+        :param chunk_size: 每次读取的字节数
+        :return: 32 字节摘要
+        """
+        if isinstance(source, (str, bytes, os.PathLike)):
+            with open(source, 'rb') as f:
+                return SM3.hash_file(f, chunk_size)
+
+        h = SM3()
+        readinto = getattr(source, 'readinto', None)
+        if readinto is not None:
+            # 复用同一个缓冲区, 避免每块分配新对象
+            buf = bytearray(chunk_size)
+            mv = memoryview(buf)
+            while True:
+                n = readinto(buf)
+                if not n:
+                    break
+                h.update(mv[:n])
+        else:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                h.update(chunk)
+        return h.digest()
+
+    # 批量哈希时每批最多并行的消息数 (限制中间数组的内存占用)
+    LANES = 1 << 16
+    # 同长度分组内消息数少于该值时直接逐条计算, NumPy 的调度开销不划算
+    MIN_LANES = 32
+
+    @staticmethod
+    def hash_many(messages: List[bytes]) -> List[bytes]:
+        """
+        批量 SM3 哈希 (NumPy 多通道并行)
+        按填充后的分组数把消息归类, 同一类消息打包成 uint32 数组,
+        消息扩展和 64 轮迭代在所有通道上向量化执行
+        :param messages: 消息列表
+        :return: 与输入顺序一致的摘要列表
+        """
+        if np is None:
+            return [SM3.hash(m) for m in messages]
+
+        # 按填充后的分组数归类
+        groups = {}
+        for i, m in enumerate(messages):
+            groups.setdefault((len(m) + 72) // 64, []).append(i)
+
+        digests = [b''] * len(messages)
+        for nblocks, indices in groups.items():
+            if len(indices) < SM3.MIN_LANES:
+                for i in indices:
+                    digests[i] = SM3.hash(messages[i])
+                continue
+            for k in range(0, len(indices), SM3.LANES):
+                chunk = indices[k:k + SM3.LANES]
+                out = SM3._hash_lanes([messages[i] for i in chunk], nblocks)
+                for j, i in enumerate(chunk):
+                    digests[i] = out[j * 32:(j + 1) * 32]
+        return digests
+
+    @staticmethod
+    def hash_fixed(buffer, msg_len: int) -> bytes:
+        """
+        批量哈希首尾相接存放的定长消息, 不需要拆成 bytes 对象列表
+        :param buffer: 长度为 msg_len 整数倍的连续缓冲区
+        :param msg_len: 每条消息的字节数
+        :return: 所有摘要按顺序拼接的字节串
+        """
+        mv = memoryview(buffer).cast('B')
+        n = len(mv) // msg_len
+        if np is None or n < SM3.MIN_LANES:
+            return b''.join(SM3.hash(mv[i:i + msg_len]) for i in range(0, n * msg_len, msg_len))
+
+        # 直接在数组上做填充
+        nblocks = (msg_len + 72) // 64
+        msgs = np.frombuffer(mv, dtype=np.uint8).reshape(n, msg_len)
+        tail = np.frombuffer(struct.pack('>Q', msg_len * 8), dtype=np.uint8)
+        out = []
+        for k in range(0, n, SM3.LANES):
+            chunk = msgs[k:k + SM3.LANES]
+            padded = np.zeros((len(chunk), nblocks * 64), dtype=np.uint8)
+            padded[:, :msg_len] = chunk
+            padded[:, msg_len] = 0x80
+            padded[:, -8:] = tail
+            out.append(SM3._hash_padded(padded, nblocks))
+        return b''.join(out)
+
+    @staticmethod
+    def _hash_lanes(messages: List[bytes], nblocks: int) -> bytes:
+        """
+        对填充后分组数相同的一组消息做向量化 SM3
+        :return: 所有摘要按顺序拼接的字节串
+        """
+        padded = b''.join(
+            m + b'\x80' + b'\x00' * ((55 - len(m)) % 64) + struct.pack('>Q', len(m) * 8)
+            for m in messages
+        )
+        return SM3._hash_padded(np.frombuffer(padded, dtype=np.uint8), nblocks)
+
+    @staticmethod
+    def _hash_padded(padded, nblocks: int) -> bytes:
+        """
+        :param padded: 已填充消息首尾相接的 uint8 数组, 每条 nblocks 个分组
+        :return: 所有摘要按顺序拼接的字节串
+        """
+        # (n, nblocks, 16) -> (nblocks, 16, n): 每个消息字在所有通道上连续存放
+        words = np.ascontiguousarray(padded).reshape(-1).view('>u4').astype(np.uint32)
+        n = len(words) // (nblocks * 16)
+        words = np.ascontiguousarray(words.reshape(n, nblocks, 16).transpose(1, 2, 0))
+
+        v = [np.full(n, x, dtype=np.uint32) for x in SM3.IV]
+        for blk in range(nblocks):
+            v = SM3._compress_lanes(v, words[blk])
+
+        return np.stack(v, axis=1).astype('>u4').tobytes()
+
+    @staticmethod
+    def _compress_lanes(iv: list, block) -> list:
+        """压缩函数的多通道版本, uint32 运算自动模 2^32"""
+        def rotl(x, r):
+            return (x << np.uint32(r)) | (x >> np.uint32(32 - r))
+
+        # 消息扩展
+        w = list(block)
+        for j in range(16, 68):
+            x = w[j - 16] ^ w[j - 9] ^ rotl(w[j - 3], 15)
+            w.append(x ^ rotl(x, 15) ^ rotl(x, 23) ^ rotl(w[j - 13], 7) ^ w[j - 6])
+
+        a, b, c, d, e, f, g, h = iv
+        for j in range(64):
+            a12 = rotl(a, 12)
+            ss1 = rotl(a12 + e + np.uint32(SM3.T_ROT[j]), 7)
+            if j < 16:
+                ff = a ^ b ^ c
+                gg = e ^ f ^ g
+            else:
+                ff = (a & (b | c)) | (b & c)
+                gg = g ^ (e & (f ^ g))
+            tt1 = ff + d + (ss1 ^ a12) + (w[j] ^ w[j + 4])
+            tt2 = gg + h + ss1 + w[j]
+            d = c
+            c = rotl(b, 9)
+            b = a
+            a = tt1
+            h = g
+            g = rotl(f, 19)
+            f = e
+            e = tt2 ^ rotl(tt2, 9) ^ rotl(tt2, 17)
+
+        return [x ^ y for x, y in zip(iv, (a, b, c, d, e, f, g, h))]
+
+
+# ====================== SM3 后端选择 (原生实现优先) ======================
+# 标准测试向量, 后端启用前必须全部通过
+SM3_TEST_VECTORS = [
+    (b"", "1ab21d8355cfa17f8e61194831e81a8f22bec8c728fefb747ed035eb5082aa2b"),
+    (b"abc", "66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0"),
+    (b"abcd" * 16, "debe9ff92275b8a138604889c18e5a4d6fdb70e5387e5765293dcba39c0c5732")
+]
+
+
+class SM3Backend:
+    """SM3 后端: 统一 new / hash / hash_many 接口"""
+
+    def __init__(self, name: str, new, hash_many=None, hash_fixed=None):
+        """
+        :param name: 后端名称
+        :param new: 创建 hashlib 风格哈希对象的函数 new(data=b'')
+        :param hash_many: 可选的批量哈希函数, 缺省时逐条计算
+        :param hash_fixed: 可选的定长消息批量哈希函数, 缺省时逐条计算
+        """
+        self.name = name
+        self.new = new
+        if hash_many is not None:
+            self.hash_many = hash_many
+        if hash_fixed is not None:
+            self.hash_fixed = hash_fixed
+        # 是否有真正的批量实现 (整层计算比逐节点计算更快)
+        self.batched = hash_fixed is not None
+
+    def hash(self, msg: bytes) -> bytes:
+        """一次性哈希"""
+        return self.new(msg).digest()
+
+    def hash_many(self, messages: List[bytes]) -> List[bytes]:
+        """批量哈希"""
+        return [self.hash(m) for m in messages]
+
+    def hash_fixed(self, buffer, msg_len: int) -> bytes:
+        """批量哈希首尾相接的定长消息, 返回拼接后的摘要"""
+        mv = memoryview(buffer).cast('B')
+        return b''.join(self.hash(mv[i:i + msg_len]) for i in range(0, len(mv) - msg_len + 1, msg_len))
+
+    def verify(self) -> bool:
+        """用测试向量交叉验证后端 (含流式接口)"""
+        for msg, expected in SM3_TEST_VECTORS:
+            if self.hash(msg).hex() != expected:
+                return False
+            h = self.new(msg[:1])
+            h.copy().update(b'garbage')
+            h.update(msg[1:])
+            if h.hexdigest() != expected:
+                return False
+        msgs = [m for m, _ in SM3_TEST_VECTORS]
+        if [d.hex() for d in self.hash_many(msgs)] != [e for _, e in SM3_TEST_VECTORS]:
+            return False
+        # 定长批量接口: 64 条 "abc"
+        return self.hash_fixed(b"abc" * 64, 3).hex() == SM3_TEST_VECTORS[1][1] * 64
+
+
+def _python_backend() -> SM3Backend:
+    """纯 Python 实现 (经过验证的兜底后端)"""
+    if np is not None:
+        backend = SM3Backend('python', SM3, SM3.hash_many, SM3.hash_fixed)
+    else:
+        backend = SM3Backend('python', SM3)
+    backend.hash = SM3.hash
+    return backend
+
+
+def _openssl_backend() -> Optional[SM3Backend]:
+    """OpenSSL 原生实现 (hashlib.new('sm3')), 不可用时返回 None"""
+    try:
+        proto = hashlib.new('sm3')
+    except (ValueError, TypeError):
+        return None
+
+    def new(data: bytes = b''):
+        # 复制空状态对象比按名字 hashlib.new 更快
+        h = proto.copy()
+        if data:
+            h.update(data)
+        return h
+
+    return SM3Backend('openssl', new)
+
 
-        # 处理消息分组
-        v = SM3.IV.copy()
-        for i in range(0, len(padded_msg), 64):
-            block = padded_msg[i:i + 64]
-            v = SM3._compress(v, block)
+# 候选原生后端, 按优先级探测
+SM3_NATIVE_PROBES = [_openssl_backend]
 
-        # 将最终状态转换为字节
-        return b''.join(struct.pack('>I', x) for x in v)
+
+def _select_sm3_backend() -> SM3Backend:
+    """
+    导入时选择后端: 环境变量 SM3_BACKEND=python 可强制使用纯 Python 实现,
+    否则使用第一个可用且通过测试向量的原生后端
+    """
+    if os.environ.get('SM3_BACKEND', '').lower() != 'python':
+        for probe in SM3_NATIVE_PROBES:
+            backend = probe()
+            if backend is not None and backend.verify():
+                return backend
+    return _python_backend()
+
+
+sm3_backend = _select_sm3_backend()
+
+
+def set_sm3_backend(backend: SM3Backend) -> None:
+    """替换当前后端 (启用前同样要通过测试向量)"""
+    global sm3_backend
+    if not backend.verify():
+        raise ValueError(f"SM3 backend '{backend.name}' failed test vectors")
+    sm3_backend = backend
+
+
+def sm3_new(data: bytes = b''):
+    """使用当前后端创建流式哈希对象"""
+    return sm3_backend.new(data)
+
+
+def sm3_hash(msg: bytes) -> bytes:
+    """使用当前后端计算 SM3"""
+    return sm3_backend.hash(msg)
+
+
+def sm3_hash_many(messages: List[bytes]) -> List[bytes]:
+    """使用当前后端批量计算 SM3"""
+    return sm3_backend.hash_many(messages)
+
+
+def sm3_hash_fixed(buffer, msg_len: int) -> bytes:
+    """使用当前后端批量计算首尾相接的定长消息"""
+    return sm3_backend.hash_fixed(buffer, msg_len)
 
 
 # ====================== b) 长度扩展攻击验证 ======================
@@ -117,19 +494,11 @@ class SM3LengthExtensionAttack:
         pad_len = (55 - original_len) % 64
         padding = b'\x80' + b'\x00' * pad_len + struct.pack('>Q', original_len * 8)
 
-        # 设置初始状态为原始哈希值
-        state = list(struct.unpack('>8I', original_hash))
-
-        # 处理扩展消息 (带填充)
-        new_msg = padding + extension
-        padded_new_msg = SM3._padding(new_msg)
-
-        # 处理每个分组
-        for i in range(0, len(padded_new_msg), 64):
-            block = padded_new_msg[i:i + 64]
-            state = SM3._compress(state, block)
-
-        return b''.join(struct.pack('>I', x) for x in state)
+        # 以原始哈希值为链接状态继续压缩 (需要从任意链接状态恢复, 只能使用纯 Python 实现)
+        # 最终填充按 原始消息 + 填充 + 扩展 的总长度计算
+        h = SM3.resume(original_hash, original_len + len(padding))
+        h.update(extension)
+        return h.digest()
 
     @staticmethod
     def verify():
@@ -139,7 +508,7 @@ class SM3LengthExtensionAttack:
         original_msg = b"Hello, world!"
 
         # 计算原始哈希
-        original_hash = SM3.hash(key + original_msg)
+        original_hash = sm3_hash(key + original_msg)
         print(f"原始消息哈希: {original_hash.hex()}")
 
         # 扩展消息
@@ -147,7 +516,7 @@ class SM3LengthExtensionAttack:
 
         # 计算新消息的正确哈希
         new_msg = key + original_msg + SM3._padding(key + original_msg)[len(key + original_msg):] + extension
-        correct_new_hash = SM3.hash(new_msg)
+        correct_new_hash = sm3_hash(new_msg)
 
         # 使用长度扩展攻击计算新哈希
         original_len = len(key) + len(original_msg)
@@ -159,53 +528,365 @@ class SM3LengthExtensionAttack:
         print(f"攻击是否成功: {correct_new_hash == attack_hash}")
 
 
+# ====================== HMAC-SM3 ======================
+class HMACSM3:
+    """
+    HMAC-SM3 (RFC 2104)
+    每个密钥只压缩一次 ipad/opad 分组并缓存中间状态,
+    之后每次 MAC 只需处理消息分组和一次外层终结分组
+    """
+    digest_size = 32
+    block_size = 64
+
+    def __init__(self, key: bytes):
+        """
+        :param key: 任意长度密钥
+        """
+        if len(key) > self.block_size:
+            key = sm3_hash(key)
+        key = key.ljust(self.block_size, b'\x00')
+
+        # 缓存的中间状态: 已吸收 K^ipad / K^opad 一个完整分组
+        self._inner = sm3_new(bytes(k ^ 0x36 for k in key))
+        self._outer = sm3_new(bytes(k ^ 0x5c for k in key))
+
+    def new(self, msg: bytes = b''):
+        """返回已吸收内层密钥分组的流式哈希对象, 用于分块计算长消息的 MAC"""
+        inner = self._inner.copy()
+        if msg:
+            inner.update(msg)
+        return inner
+
+    def finalize(self, inner) -> bytes:
+        """用外层中间状态完成 MAC"""
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
+
+    def mac(self, msg: bytes) -> bytes:
+        """计算消息的 MAC"""
+        return self.finalize(self.new(msg))
+
+    def verify(self, msg: bytes, tag: bytes) -> bool:
+        """常数时间比较 MAC"""
+        return hmac.compare_digest(self.mac(msg), tag)
+
+
+def hmac_sm3(key: bytes, msg: bytes) -> bytes:
+    """一次性计算 HMAC-SM3 (频繁使用同一密钥时请复用 HMACSM3 对象)"""
+    return HMACSM3(key).mac(msg)
+
+
 # ====================== c) Merkle 树实现 ======================
+class MerkleLevel:
+    """
+    Merkle 树的一层节点, 所有 32 字节哈希连续存放在一个 bytearray 中,
+    第 i 个节点位于偏移 32*i 处, 按下标取出的是零拷贝的 memoryview
+    """
+    NODE_SIZE = 32
+
+    def __init__(self, data=b''):
+        self.data = bytearray(data)
+        self._view = memoryview(self.data)
+
+    @staticmethod
+    def wrap(buffer) -> 'MerkleLevel':
+        """直接包装已有缓冲区 (如 mmap 视图), 不拷贝"""
+        level = MerkleLevel.__new__(MerkleLevel)
+        level._view = memoryview(buffer)
+        level.data = level._view
+        return level
+
+    @staticmethod
+    def allocate(count: int) -> 'MerkleLevel':
+        """预分配 count 个节点的存储"""
+        return MerkleLevel(bytes(count * MerkleLevel.NODE_SIZE))
+
+    def __len__(self) -> int:
+        return len(self.data) // self.NODE_SIZE
+
+    def __getitem__(self, index: int) -> memoryview:
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("node index out of range")
+        offset = index * self.NODE_SIZE
+        return self._view[offset:offset + self.NODE_SIZE]
+
+    def __iter__(self):
+        for offset in range(0, len(self.data), self.NODE_SIZE):
+            yield self._view[offset:offset + self.NODE_SIZE]
+
+
+class PackedProof:
+    """
+    存在性证明的紧凑二进制格式:
+    文件头 (叶子索引 u64, 树大小 u64, 节点数 u8) + 方向位图 (第 i 位为 1 表示兄弟在右侧) + 依次拼接的 32 字节兄弟节点
+    解析后按 (兄弟节点视图, 是否在右侧) 迭代, 可直接传给 MerkleTree.verify_inclusion, 不拷贝节点
+    """
+    HEADER = struct.Struct('>QQB')
+    NODE_SIZE = 32
+
+    def __init__(self, buffer):
+        """
+        零拷贝解析
+        :param buffer: encode 生成的字节串或任意缓冲区
+        """
+        view = memoryview(buffer).cast('B')
+        if len(view) < self.HEADER.size:
+            raise ValueError("Truncated proof")
+        self.index, self.size, count = self.HEADER.unpack_from(view)
+        bitmap_len = (count + 7) // 8
+        nodes_start = self.HEADER.size + bitmap_len
+        if len(view) != nodes_start + count * self.NODE_SIZE:
+            raise ValueError("Invalid proof length")
+        self._count = count
+        self._bitmap = int.from_bytes(view[self.HEADER.size:nodes_start], 'little')
+        self._nodes = view[nodes_start:]
+
+    @staticmethod
+    def encode(index: int, size: int, proof: List[Tuple[bytes, bool]]) -> bytes:
+        """
+        序列化存在性证明
+        :param index: 叶子索引
+        :param size: 树的叶子数
+        :param proof: inclusion_proof 返回的证明路径
+        """
+        bitmap = 0
+        for i, (_, is_right) in enumerate(proof):
+            if is_right:
+                bitmap |= 1 << i
+        return b''.join([
+            PackedProof.HEADER.pack(index, size, len(proof)),
+            bitmap.to_bytes((len(proof) + 7) // 8, 'little'),
+            *[sibling for sibling, _ in proof],
+        ])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> Tuple[memoryview, bool]:
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("proof index out of range")
+        offset = i * self.NODE_SIZE
+        return self._nodes[offset:offset + self.NODE_SIZE], bool((self._bitmap >> i) & 1)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+
 class MerkleTree:
     def __init__(self, data: List[bytes]):
         """
         构建 Merkle 树 (RFC6962)
         :param data: 叶子节点的数据列表
         """
-        # 计算叶子节点的哈希 (带前缀 0x00)
-        self.leaves = [SM3.hash(b'\x00' + d) for d in data]
+        # 每层构建统计: 节点数, 哈希调用次数, 耗时 (秒)
+        self.build_stats = []
+
+        start = time.perf_counter()
+        self.leaves = self._hash_leaves(data)
+        self.build_stats.append({'level': 0, 'nodes': len(self.leaves), 'hash_calls': len(self.leaves),
+                                 'seconds': time.perf_counter() - start})
+
         self.tree = self._build_tree(self.leaves)
-        self.root = self.tree[-1][0] if self.tree else b''
+        self.root = bytes(self.tree[-1][0]) if self.tree else b''
 
-    def _build_tree(self, nodes: List[bytes]) -> List[List[bytes]]:
+    def _hash_leaves(self, data: List[bytes]) -> MerkleLevel:
+        """计算叶子节点的哈希 (带前缀 0x00, 批量并行计算), 整层连续存储"""
+        return MerkleLevel(b''.join(sm3_hash_many([b'\x00' + d for d in data])))
+
+    def _build_tree(self, nodes: MerkleLevel) -> List[MerkleLevel]:
         """
-        递归构建 Merkle 树
-        :param nodes: 当前层的节点列表
-        :return: 整个 Merkle 树 (每层节点列表)
+        逐层迭代构建 Merkle 树
+        :param nodes: 叶子层
+        :return: 整个 Merkle 树 (每层一段连续存储)
         """
-        if not nodes:
+        if not len(nodes):
             return []
 
         tree = [nodes]
-        if len(nodes) == 1:
-            return tree
-
-        # 构建父层节点
-        parents = []
-        for i in range(0, len(nodes), 2):
-            left = nodes[i]
-            right = nodes[i + 1] if i + 1 < len(nodes) else left
-            # 内部节点带前缀 0x01
-            parent = SM3.hash(b'\x01' + left + right)
-            parents.append(parent)
-
-        # 递归构建
-        tree.extend(self._build_tree(parents))
+        self._grow(tree)
         return tree
 
+    def _grow(self, tree: List[MerkleLevel], height: Optional[int] = None) -> None:
+        """
+        从 tree 的最上层继续逐层构建, 直到只剩一个节点
+        :param height: 指定时一直构建到第 height 层 (用于并行构建中的对齐子树)
+        """
+        # 内部节点输入 0x01 || left || right 共用一个 65 字节缓冲区
+        scratch = bytearray(65)
+        scratch[0] = 0x01
+
+        while (len(tree) <= height) if height is not None else (len(tree[-1]) > 1):
+            start = time.perf_counter()
+            level = tree[-1]
+            parents = MerkleLevel.allocate((len(level) + 1) // 2)
+            calls = self._hash_level(level, parents, scratch)
+            tree.append(parents)
+            self.build_stats.append({'level': len(tree) - 1, 'nodes': len(parents), 'hash_calls': calls,
+                                     'seconds': time.perf_counter() - start})
+
+    @staticmethod
+    def build_parallel(data: List[bytes], workers: Optional[int] = None,
+                       chunk_size: int = 1 << 16) -> 'MerkleTree':
+        """
+        多进程并行构建
+        叶子按 2 的幂对齐分块, 各块的子树在进程池中计算, 主进程拼接各层后计算上层节点;
+        最后一块不满时在块内按同样的复制规则补齐到块高度, 因此根和证明与串行构建逐位一致
+        :param data: 叶子节点的数据列表
+        :param workers: 进程数, 默认为 CPU 核数
+        :param chunk_size: 每块叶子数, 向上取整为 2 的幂
+        """
+        height = max(chunk_size - 1, 1).bit_length()
+        chunk = 1 << height
+        if len(data) <= chunk:
+            return MerkleTree(data)
+
+        chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_build_subtree, chunks, itertools.repeat(height)))
+
+        # 拼接各块的同一层; 块内各层耗时为所有进程耗时之和
+        tree = MerkleTree.__new__(MerkleTree)
+        tree.build_stats = []
+        levels = []
+        for k in range(height + 1):
+            level = MerkleLevel(b''.join(r[0][k] for r in results))
+            levels.append(level)
+            tree.build_stats.append({'level': k, 'nodes': len(level), 'hash_calls': len(level),
+                                     'seconds': sum(r[1][k] for r in results)})
+        tree._grow(levels)
+
+        tree.leaves = levels[0]
+        tree.tree = levels
+        tree.root = bytes(levels[-1][0])
+        return tree
+
+    @staticmethod
+    def _hash_level(level: MerkleLevel, parents: MerkleLevel, scratch: bytearray) -> int:
+        """
+        计算一层父节点并直接写入预分配的 parents 存储 (奇数个节点时复制最后一个)
+        :return: 哈希调用次数
+        """
+        n = len(level)
+        src = level.data
+        out = parents.data
+        size = MerkleLevel.NODE_SIZE
+
+        if sm3_backend.batched:
+            # 批量后端: 整层输入排成定长 65 字节消息一次计算
+            pairs = np.frombuffer(src, dtype=np.uint8)
+            if n % 2:
+                pairs = np.concatenate([pairs, pairs[-size:]])
+            inputs = np.empty((len(pairs) // (2 * size), 2 * size + 1), dtype=np.uint8)
+            inputs[:, 0] = 0x01
+            inputs[:, 1:] = pairs.reshape(-1, 2 * size)
+            out[:] = sm3_hash_fixed(inputs, 2 * size + 1)
+            return len(parents)
+
+        # 逐节点计算: 兄弟节点在存储中相邻, 拷入缓冲区后直接哈希
+        view = level._view
+        hash_ = sm3_hash
+        for i in range(n // 2):
+            scratch[1:] = view[2 * size * i:2 * size * (i + 1)]
+            out[size * i:size * (i + 1)] = hash_(scratch)
+        if n % 2:
+            scratch[1:1 + size] = scratch[1 + size:] = view[-size:]
+            out[-size:] = hash_(scratch)
+        return len(parents)
+
+    def format_build_stats(self) -> str:
+        """按层格式化构建统计"""
+        lines = [f"{'层':>4} {'节点数':>9} {'哈希次数':>8} {'耗时(ms)':>10}"]
+        for st in self.build_stats:
+            lines.append(f"{st['level']:>5} {st['nodes']:>12} {st['hash_calls']:>12} {st['seconds'] * 1000:>12.3f}")
+        return '\n'.join(lines)
+
     def get_root(self) -> bytes:
         """获取根哈希"""
         return self.root
 
+    # 磁盘格式: 32 字节文件头 (魔数, 节点大小, 层数, 叶子数, 保留) + 各层节点依次排列
+    FILE_MAGIC = b'SM3MRKL1'
+    FILE_HEADER = struct.Struct('>8sIIQ8x')
+
+    def save(self, path) -> None:
+        """
+        保存为定长记录文件, 之后可用 MerkleTree.open 以 mmap 方式打开
+        :param path: 文件路径
+        """
+        with open(path, 'wb') as f:
+            f.write(self.FILE_HEADER.pack(self.FILE_MAGIC, MerkleLevel.NODE_SIZE,
+                                          len(self.tree), len(self.leaves)))
+            for level in self.tree:
+                f.write(level.data)
+
+    @classmethod
+    def open(cls, path) -> 'MerkleTree':
+        """
+        以 mmap 方式打开保存的树, 不读取整个文件, O(1) 启动
+        多个进程打开同一文件时共享页缓存
+        :param path: 文件路径
+        """
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = cls.FILE_HEADER
+        if len(mm) < header.size:
+            mm.close()
+            raise ValueError("Invalid Merkle tree file")
+        magic, node_size, level_count, leaf_count = header.unpack_from(mm)
+
+        # 由叶子数推出每层节点数, 检查文件大小
+        counts = []
+        n = leaf_count
+        while n:
+            counts.append(n)
+            if n == 1:
+                break
+            n = (n + 1) // 2
+        expected = header.size + sum(counts) * node_size
+        if magic != cls.FILE_MAGIC or node_size != MerkleLevel.NODE_SIZE \
+                or level_count != len(counts) or len(mm) != expected:
+            mm.close()
+            raise ValueError("Invalid Merkle tree file")
+
+        tree = cls.__new__(cls)
+        tree._mmap = mm
+        view = memoryview(mm)
+        tree.tree = []
+        offset = header.size
+        for count in counts:
+            tree.tree.append(MerkleLevel.wrap(view[offset:offset + count * node_size]))
+            offset += count * node_size
+        tree.leaves = tree.tree[0] if tree.tree else MerkleLevel()
+        tree.root = bytes(tree.tree[-1][0]) if tree.tree else b''
+        tree.build_stats = []
+        return tree
+
+    def close(self) -> None:
+        """关闭 open 打开的文件映射 (仍有证明引用节点视图时交给垃圾回收)"""
+        mm = getattr(self, '_mmap', None)
+        if mm is None:
+            return
+        self.tree = []
+        self.leaves = MerkleLevel()
+        self._mmap = None
+        try:
+            mm.close()
+        except BufferError:
+            pass
+
     def inclusion_proof(self, index: int) -> List[Tuple[bytes, bool]]:
         """
         存在性证明
         :param index: 叶子节点的索引
-        :return: 证明路径 (节点哈希和位置)
+        :return: 证明路径 (节点哈希和位置), 节点哈希是树存储上的零拷贝视图
         """
         if index < 0 or index >= len(self.leaves):
             raise ValueError("Invalid index")
@@ -238,6 +919,10 @@ class MerkleTree:
 
         return proof
 
+    def inclusion_proof_bytes(self, index: int) -> bytes:
+        """存在性证明的紧凑二进制编码 (见 PackedProof)"""
+        return PackedProof.encode(index, len(self.leaves), self.inclusion_proof(index))
+
     @staticmethod
     def verify_inclusion(root: bytes, leaf: bytes, index: int, proof: List[Tuple[bytes, bool]]) -> bool:
         """
@@ -249,24 +934,213 @@ class MerkleTree:
         :return: 验证是否成功
         """
         # 计算叶子哈希
-        current_hash = SM3.hash(b'\x00' + leaf)
+        current_hash = sm3_hash(b'\x00' + leaf)
 
         # 从叶子节点开始重建路径
         for i, (sibling_hash, is_right) in enumerate(proof):
             if is_right:
-                current_hash = SM3.hash(b'\x01' + current_hash + sibling_hash)
+                current_hash = sm3_hash(b'\x01' + current_hash + sibling_hash)
             else:
-                current_hash = SM3.hash(b'\x01' + sibling_hash + current_hash)
+                current_hash = sm3_hash(b'\x01' + sibling_hash + current_hash)
 
         return current_hash == root
 
+    def multi_inclusion_proof(self, indices: List[int]) -> list:
+        """
+        批量存在性证明: 多个叶子共享上层节点, 只返回验证方无法自行算出的兄弟节点
+        :param indices: 叶子索引列表
+        :return: 兄弟节点哈希列表 (逐层、每层按索引升序)
+        """
+        known = sorted(set(indices))
+        if not known or known[0] < 0 or known[-1] >= len(self.leaves):
+            raise ValueError("Invalid index")
+
+        proof = []
+        for level_nodes in self.tree[:-1]:
+            known_set = set(known)
+            for i in known:
+                sibling = i ^ 1
+                # 兄弟也在集合中, 或者是被复制的最后一个节点时, 不需要证明
+                if sibling not in known_set and sibling < len(level_nodes):
+                    proof.append(level_nodes[sibling])
+            known = sorted({i // 2 for i in known})
+        return proof
+
+    @staticmethod
+    def verify_multi_inclusion(root: bytes, leaves: List[bytes], indices: List[int],
+                               size: int, proof: list) -> bool:
+        """
+        验证批量存在性证明, 自底向上一次重建所有路径, 每个内部节点只哈希一次
+        :param root: 根哈希
+        :param leaves: 叶子数据, 与 indices 一一对应
+        :param indices: 叶子索引
+        :param size: 树的叶子数
+        :param proof: multi_inclusion_proof 返回的证明
+        :return: 验证是否成功
+        """
+        if len(leaves) != len(indices) or not indices:
+            return False
+        if min(indices) < 0 or max(indices) >= size:
+            return False
+
+        nodes = {}
+        for i, h in zip(indices, sm3_hash_many([b'\x00' + leaf for leaf in leaves])):
+            if nodes.setdefault(i, h) != h:
+                return False  # 同一索引给出了不同的叶子
+
+        siblings = iter(proof)
+        width = size
+        try:
+            while width > 1:
+                known = sorted(nodes)
+                parents = []
+                inputs = []
+                for i in known:
+                    if i & 1 and i - 1 in nodes:
+                        continue  # 已与左兄弟一起处理
+                    if i & 1:
+                        left, right = next(siblings), nodes[i]
+                    elif i + 1 in nodes:
+                        left, right = nodes[i], nodes[i + 1]
+                    elif i + 1 < width:
+                        left, right = nodes[i], next(siblings)
+                    else:
+                        left = right = nodes[i]  # 最后一个节点复制
+                    parents.append(i // 2)
+                    inputs.append(b'\x01' + left + right)
+                nodes = dict(zip(parents, sm3_hash_many(inputs)))
+                width = (width + 1) // 2
+        except StopIteration:
+            return False
+
+        return next(siblings, None) is None and nodes.get(0) == root
+
+    def _node(self, level: int, index: int, size: int):
+        """
+        前 size 个叶子构成的树中 (level, index) 节点的值
+        完整子树直接取缓存节点, 只有右边界上的不完整节点需要重新计算
+        """
+        if ((index + 1) << level) <= size or size == len(self.leaves):
+            return self.tree[level][index]
+        left = self._node(level - 1, 2 * index, size)
+        if ((2 * index + 1) << (level - 1)) < size:
+            right = self._node(level - 1, 2 * index + 1, size)
+        else:
+            right = left
+        return sm3_hash(b'\x01' + left + right)
+
+    def consistency_proof(self, m: int, n: Optional[int] = None) -> list:
+        """
+        一致性证明: 证明 m 个叶子的树是 n 个叶子的树的前缀
+        证明由两部分组成:
+        1. 旧树的 frontier (前 m 个叶子按二进制位分解出的完整子树根, 从左到右),
+           只有一个时就是旧根本身, 省略
+        2. 沿新树中跨越位置 m 的路径向下, 遇到的完全位于新增叶子中的节点
+        :param m: 旧树大小
+        :param n: 新树大小, 默认为当前树大小
+        :return: 节点哈希列表, 共 O(log n) 个
+        """
+        size = len(self.leaves)
+        n = size if n is None else n
+        if not 0 < m <= n <= size:
+            raise ValueError("Invalid tree sizes")
+        if m == n:
+            return []
+
+        proof = []
+        blocks = [k for k in reversed(range(m.bit_length())) if (m >> k) & 1]
+        if len(blocks) > 1:
+            lo = 0
+            for k in blocks:
+                proof.append(self.tree[k][lo >> k])
+                lo += 1 << k
+
+        def walk(level: int, index: int):
+            lo = index << level
+            if lo >= m:
+                proof.append(self._node(level, index, n))
+                return
+            if lo + (1 << level) <= m:
+                return  # 旧树 frontier 中的节点
+            walk(level - 1, 2 * index)
+            if ((2 * index + 1) << (level - 1)) < n:
+                walk(level - 1, 2 * index + 1)
+
+        walk((n - 1).bit_length(), 0)
+        return proof
+
+    @staticmethod
+    def _consistency_root(m: int, n: int, node) -> bytes:
+        """
+        按 n 个叶子的树结构自顶向下计算根, 所需节点由 node(kind, level, index) 提供:
+        kind 为 'old' 表示旧树 frontier 中的完整子树, 'new' 表示完全位于新增叶子中的节点
+        """
+        def walk(level: int, index: int) -> bytes:
+            lo = index << level
+            if lo >= m:
+                return node('new', level, index)
+            if lo + (1 << level) <= m:
+                return node('old', level, index)
+            left = walk(level - 1, 2 * index)
+            if ((2 * index + 1) << (level - 1)) < n:
+                right = walk(level - 1, 2 * index + 1)
+            else:
+                right = left
+            return sm3_hash(b'\x01' + left + right)
+
+        return walk((n - 1).bit_length(), 0)
+
+    @staticmethod
+    def verify_consistency(old_root: bytes, new_root: bytes, m: int, n: int, proof: list) -> bool:
+        """
+        验证一致性证明
+        :param old_root: 旧树 (m 个叶子) 的根哈希
+        :param new_root: 新树 (n 个叶子) 的根哈希
+        :param m: 旧树大小
+        :param n: 新树大小
+        :param proof: consistency_proof 返回的证明
+        :return: 验证是否成功
+        """
+        if not 0 < m <= n:
+            return False
+        if m == n:
+            return old_root == new_root and not proof
+
+        # 还原旧树 frontier 并检查它确实得到旧根
+        blocks = [k for k in reversed(range(m.bit_length())) if (m >> k) & 1]
+        if len(blocks) == 1:
+            frontier = {blocks[0]: old_root}
+            rest = iter(proof)
+        else:
+            if len(proof) < len(blocks):
+                return False
+            frontier = dict(zip(blocks, proof))
+            rest = iter(proof[len(blocks):])
+            if MerkleLog.fold_frontier(frontier, m) != old_root:
+                return False
+
+        def node(kind: str, level: int, index: int):
+            return frontier[level] if kind == 'old' else next(rest)
+
+        # 用同一组 frontier 节点加上新增节点计算新根
+        try:
+            root = MerkleTree._consistency_root(m, n, node)
+        except StopIteration:
+            return False
+        return next(rest, None) is None and root == new_root
+
+    @staticmethod
+    def proof_index(proof: List[Tuple[bytes, bool]]) -> int:
+        """由证明路径中的方向还原叶子索引 (兄弟在左侧的层对应索引位为 1)"""
+        return sum(1 << level for level, (_, is_right) in enumerate(proof) if not is_right)
+
     def non_inclusion_proof(self, leaf: bytes) -> Tuple[Optional[int], List[Tuple[bytes, bool]]]:
         """
         不存在性证明
         :param leaf: 要证明不存在的叶子节点数据
         :return: (最近叶子的索引, 证明路径)
         """
-        leaf_hash = SM3.hash(b'\x00' + leaf)
+        leaf_hash = sm3_hash(b'\x00' + leaf)
 
         # 查找最近的叶子节点
         closest_index = None
@@ -300,8 +1174,8 @@ class MerkleTree:
             return False
 
         # 验证目标叶子在最近叶子之间不存在
-        leaf_hash = SM3.hash(b'\x00' + leaf)
-        closest_hash = SM3.hash(b'\x00' + closest_leaf)
+        leaf_hash = sm3_hash(b'\x00' + leaf)
+        closest_hash = sm3_hash(b'\x00' + closest_leaf)
 
         # 比较哈希值
         if leaf_hash == closest_hash:
@@ -311,21 +1185,608 @@ class MerkleTree:
         return (int.from_bytes(leaf_hash, 'big') < int.from_bytes(closest_hash, 'big')) == (leaf_hash < closest_hash)
 
 
+def _build_subtree(chunk: List[bytes], height: int) -> Tuple[List[bytes], List[float]]:
+    """
+    进程池任务: 构建一块叶子的子树, 一直构建到第 height 层
+    :return: (各层节点数据, 各层耗时)
+    """
+    tree = MerkleTree.__new__(MerkleTree)
+    tree.build_stats = []
+    start = time.perf_counter()
+    levels = [tree._hash_leaves(chunk)]
+    tree.build_stats.append({'seconds': time.perf_counter() - start})
+    tree._grow(levels, height)
+    return [bytes(level.data) for level in levels], [st['seconds'] for st in tree.build_stats]
+
+
+# ====================== 带缓存的存在性证明验证 ======================
+class InclusionVerifier:
+    """
+    绑定根哈希的存在性证明验证器
+    已认证的节点按 (层, 索引) 缓存在容量有限的 LRU 中, 验证路径一旦到达已认证节点立即结束,
+    同一棵树的大量证明共享上层节点时可以省去大部分哈希
+    """
+
+    def __init__(self, root: bytes, size: int, capacity: int = 1 << 16):
+        """
+        :param root: 根哈希
+        :param size: 树的叶子数
+        :param capacity: 缓存的节点数上限
+        """
+        self.root = root
+        self.size = size
+        self.capacity = capacity
+        self.height = (size - 1).bit_length() if size else 0
+        self._cache = OrderedDict()
+        self.hits = 0      # 在缓存节点处提前结束的验证次数
+        self.misses = 0    # 一直计算到根的验证次数
+        self.hashes = 0    # 实际执行的哈希次数
+
+    def verify(self, leaf: bytes, index: int, proof: List[Tuple[bytes, bool]]) -> bool:
+        """
+        验证存在性证明
+        :param leaf: 叶子节点数据
+        :param index: 叶子节点索引, 必须与证明路径的方向一致
+        :param proof: 证明路径 (也可以是 PackedProof)
+        :return: 验证是否成功
+        """
+        if not 0 <= index < self.size or len(proof) != self.height:
+            return False
+        if MerkleTree.proof_index(proof) != index:
+            return False
+
+        cache = self._cache
+        current = sm3_hash(b'\x00' + leaf)
+        self.hashes += 1
+        path = []   # 本次计算出的 ((层, 索引), 哈希), 验证成功后加入缓存
+        width = self.size
+        pos = index
+
+        for level, (sibling, is_right) in enumerate(proof):
+            cached = cache.get((level, pos))
+            if cached is not None:
+                if cached != current:
+                    return False
+                cache.move_to_end((level, pos))
+                self.hits += 1
+                self._remember(path)
+                return True
+
+            path.append(((level, pos), current))
+            if (pos ^ 1) < width:
+                path.append(((level, pos ^ 1), bytes(sibling)))
+            if is_right:
+                current = sm3_hash(b'\x01' + current + sibling)
+            else:
+                current = sm3_hash(b'\x01' + sibling + current)
+            self.hashes += 1
+            pos >>= 1
+            width = (width + 1) // 2
+
+        self.misses += 1
+        if current != self.root:
+            return False
+        self._remember(path)
+        return True
+
+    def _remember(self, path: list) -> None:
+        """缓存已认证的节点, 超出容量时淘汰最久未使用的节点"""
+        cache = self._cache
+        for key, value in path:
+            cache[key] = value
+            cache.move_to_end(key)
+        while len(cache) > self.capacity:
+            cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        """缓存统计"""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hashes': self.hashes,
+                'hit_rate': self.hits / total if total else 0.0, 'cached_nodes': len(self._cache)}
+
+
+# ====================== 有序叶子 Merkle 树 ======================
+class SortedMerkleTree(MerkleTree):
+    """
+    叶子按哈希值排序的 Merkle 树
+    不存在性证明用二分查找定位相邻叶子, 证明两个相邻叶子 (或一个边界叶子) 存在且夹住目标
+    """
+
+    def _hash_leaves(self, data: List[bytes]) -> MerkleLevel:
+        """按叶子哈希排序, 同时保存排序后的叶子数据用于构造证明"""
+        hashes = sm3_hash_many([b'\x00' + d for d in data])
+        order = sorted(range(len(data)), key=hashes.__getitem__)
+        self.data = [data[i] for i in order]
+        return MerkleLevel(b''.join(hashes[i] for i in order))
+
+    def find(self, leaf: bytes) -> Tuple[int, bool]:
+        """
+        二分查找叶子
+        :return: (插入位置, 是否存在)
+        """
+        leaf_hash = sm3_hash(b'\x00' + leaf)
+        pos = bisect.bisect_left(self.leaves, leaf_hash, key=bytes)
+        return pos, pos < len(self.leaves) and self.leaves[pos] == leaf_hash
+
+    def non_inclusion_proof(self, leaf: bytes) -> Tuple[Optional[tuple], Optional[tuple]]:
+        """
+        不存在性证明 (O(log n))
+        :param leaf: 要证明不存在的叶子节点数据
+        :return: (左邻居, 右邻居), 每个为 (索引, 叶子数据, 存在性证明), 位于边界时一侧为 None
+        """
+        pos, found = self.find(leaf)
+        if found:
+            raise ValueError("Leaf is present in the tree")
+
+        left = right = None
+        if pos > 0:
+            left = (pos - 1, self.data[pos - 1], self.inclusion_proof(pos - 1))
+        if pos < len(self.leaves):
+            right = (pos, self.data[pos], self.inclusion_proof(pos))
+        return left, right
+
+    @staticmethod
+    def verify_non_inclusion(root: bytes, leaf: bytes, size: int,
+                             left: Optional[tuple], right: Optional[tuple]) -> bool:
+        """
+        验证不存在性证明
+        :param root: 根哈希
+        :param leaf: 要证明不存在的叶子节点数据
+        :param size: 树的叶子数
+        :param left: 左邻居 (索引, 叶子数据, 存在性证明) 或 None
+        :param right: 右邻居 (索引, 叶子数据, 存在性证明) 或 None
+        :return: 验证是否成功
+        """
+        if left is None and right is None:
+            return False
+        height = (size - 1).bit_length()
+        leaf_hash = sm3_hash(b'\x00' + leaf)
+
+        for neighbour in (left, right):
+            if neighbour is None:
+                continue
+            index, data, proof = neighbour
+            # 索引必须由证明路径本身确定, 且落在真实叶子范围内 (排除被复制的最后一个节点)
+            if len(proof) != height or SortedMerkleTree.proof_index(proof) != index or not 0 <= index < size:
+                return False
+            if not MerkleTree.verify_inclusion(root, data, index, proof):
+                return False
+
+        # 相邻性: 两个邻居连续, 或者单个邻居位于边界
+        if left is not None and right is not None:
+            if right[0] != left[0] + 1:
+                return False
+        elif left is not None:
+            if left[0] != size - 1:
+                return False
+        elif right[0] != 0:
+            return False
+
+        # 目标哈希被邻居夹住
+        if left is not None and not sm3_hash(b'\x00' + left[1]) < leaf_hash:
+            return False
+        if right is not None and not leaf_hash < sm3_hash(b'\x00' + right[1]):
+            return False
+        return True
+
+
+# ====================== 追加式 Merkle 日志 ======================
+class MerkleLog:
+    """
+    追加式 Merkle 日志 (RFC6962 风格)
+    只保存右边界上各完整子树的根 (frontier), 追加一条记录最多 O(log n) 次哈希,
+    根哈希与对同样叶子构建的 MerkleTree 一致 (奇数节点复制规则相同)
+    """
+
+    def __init__(self, data: Optional[List[bytes]] = None):
+        """
+        :param data: 可选的初始叶子数据
+        """
+        self.size = 0
+        # frontier[k]: 大小为 2^k 的完整子树根, 对应 size 的第 k 位为 1
+        self.frontier: List[Optional[bytes]] = []
+        self._root: Optional[bytes] = b''
+        if data:
+            self.extend(data)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, leaf: bytes) -> int:
+        """
+        追加一个叶子
+        :param leaf: 叶子数据
+        :return: 新叶子的索引
+        """
+        return self._push(sm3_hash(b'\x00' + leaf))
+
+    def _push(self, node: bytes, height: int = 0) -> int:
+        """
+        追加一个已计算好的叶子哈希, 或一棵高度为 height 的完整子树的根
+        (此时 size 必须是 2^height 的整数倍)
+        """
+        frontier = self.frontier
+
+        # 与 size 的二进制进位相同: 低位的完整子树依次与新节点合并
+        k = height
+        while (self.size >> k) & 1:
+            node = sm3_hash(b'\x01' + frontier[k] + node)
+            frontier[k] = None
+            k += 1
+        if k >= len(frontier):
+            frontier.extend([None] * (k + 1 - len(frontier)))
+        frontier[k] = node
+
+        self.size += 1 << height
+        self._root = None
+        return self.size - 1
+
+    # extend 每批计算的叶子数 (2 的幂), 限制流式处理时的内存
+    BATCH_HEIGHT = 12
+    BATCH = 1 << BATCH_HEIGHT
+
+    def extend(self, leaves: Iterable[bytes]) -> None:
+        """
+        批量追加叶子 (可以是任意迭代器, 按批计算叶子哈希)
+        size 对齐到 BATCH 后, 每个完整批次像 MerkleTree 一样逐层整层哈希到子树根,
+        再作为高度 BATCH_HEIGHT 的节点并入 frontier; 只有不对齐的开头和末尾逐个追加
+        """
+        it = iter(leaves)
+        head = list(itertools.islice(it, -self.size % self.BATCH))
+        for node in sm3_hash_many([b'\x00' + leaf for leaf in head]):
+            self._push(node)
+
+        scratch = bytearray(65)
+        scratch[0] = 0x01
+        while True:
+            batch = list(itertools.islice(it, self.BATCH))
+            if not batch:
+                break
+            nodes = sm3_hash_many([b'\x00' + leaf for leaf in batch])
+            if len(batch) < self.BATCH:
+                for node in nodes:
+                    self._push(node)
+                break
+            level = MerkleLevel(b''.join(nodes))
+            for _ in range(self.BATCH_HEIGHT):
+                parents = MerkleLevel.allocate(len(level) // 2)
+                MerkleTree._hash_level(level, parents, scratch)
+                level = parents
+            self._push(bytes(level.data), self.BATCH_HEIGHT)
+
+    def root(self) -> bytes:
+        """当前根哈希 (O(log n) 次哈希, 结果缓存到下次追加)"""
+        if self._root is None:
+            self._root = MerkleLog.fold_frontier(self.frontier, self.size)
+        return self._root
+
+    @staticmethod
+    def fold_frontier(frontier, n: int) -> bytes:
+        """
+        由 frontier 计算 n 个叶子的根哈希
+        从最低层向上合并: 右边界上不成对的节点与自身配对, 与 MerkleTree 的规则一致
+        :param frontier: frontier[k] 为大小 2^k 的完整子树根 (n 的第 k 位为 1 时有效)
+        :param n: 叶子数
+        """
+        carry = None  # 当前层右边界上的不完整节点
+        k = 0
+        while True:
+            higher = n >> (k + 1)
+            if (n >> k) & 1:
+                node = frontier[k]
+                if carry is not None:
+                    carry = sm3_hash(b'\x01' + node + carry)
+                elif not higher:
+                    carry = node  # 只剩一个完整子树, 它就是根
+                else:
+                    carry = sm3_hash(b'\x01' + node + node)
+            elif carry is not None:
+                carry = sm3_hash(b'\x01' + carry + carry)
+            k += 1
+            if not higher:
+                break
+        return carry if carry is not None else b''
+
+    def get_root(self) -> bytes:
+        """获取根哈希 (与 MerkleTree 接口一致)"""
+        return self.root()
+
+
+def merkle_root(records: Iterable[bytes]) -> bytes:
+    """
+    流式计算根哈希, 只保留 O(log n) 个待合并的子树根
+    结果与 MerkleTree(list(records)).get_root() 相同
+    :param records: 叶子数据的迭代器
+    """
+    log = MerkleLog()
+    log.extend(records)
+    return log.root()
+
+
+def read_records(source, record_size: int) -> Iterator[bytes]:
+    """
+    从文件中按定长读取记录 (最后一条可以不足 record_size)
+    :param source: 文件路径或二进制文件对象
+    :param record_size: 每条记录的字节数
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from read_records(f, record_size)
+        return
+    while True:
+        record = source.read(record_size)
+        if not record:
+            break
+        yield record
+
+
+# ====================== 稀疏 Merkle 树 ======================
+class SparseMerkleTree:
+    """
+    以 SM3(key) 为 256 位路径的稀疏 Merkle 树
+    - 空子树哈希预先计算 (empty[k] 为高度 k 的空子树)
+    - 只含一个叶子的子树直接取该叶子的哈希 (叶子哈希绑定完整路径, 带 0x00 前缀与内部节点区分),
+      叶子停在其独占子树的顶端, 不沿 256 层逐层向上哈希
+    - 只保存至少含两个叶子的内部节点, 随机路径下每个键的存储和更新哈希次数约为 log2(n)
+    """
+    DEPTH = 256
+
+    # empty[k]: 高度为 k 的空子树哈希, 共 257 个, 首次使用时计算
+    _EMPTY: Optional[List[bytes]] = None
+
+    def __init__(self):
+        self.nodes = {}    # (层, 节点索引) -> 哈希, 只含至少两个叶子的子树, 第 0 层为叶子
+        self.values = {}   # 路径 -> 值
+        self.leaves = {}   # 路径 -> 叶子哈希
+        self._paths = []   # 已有路径 (有序), 用二分查找统计子树中的叶子
+
+    @staticmethod
+    def empty_hashes() -> List[bytes]:
+        """预计算的空子树哈希"""
+        if SparseMerkleTree._EMPTY is None:
+            empty = [b'\x00' * 32]
+            for _ in range(SparseMerkleTree.DEPTH):
+                empty.append(sm3_hash(b'\x01' + empty[-1] + empty[-1]))
+            SparseMerkleTree._EMPTY = empty
+        return SparseMerkleTree._EMPTY
+
+    @staticmethod
+    def _path(key: bytes) -> int:
+        """键的 256 位路径"""
+        return int.from_bytes(sm3_hash(key), 'big')
+
+    @staticmethod
+    def _leaf_hash(path: int, value: bytes) -> bytes:
+        """叶子哈希 (带前缀 0x00, 绑定路径)"""
+        return sm3_hash(b'\x00' + path.to_bytes(32, 'big') + value)
+
+    def _subtree_hash(self, level: int, index: int, lo: int, hi: int) -> Optional[bytes]:
+        """
+        子树哈希, _paths[lo:hi] 为该子树中的路径
+        :return: 空子树返回 None, 单叶子子树返回叶子哈希, 否则返回保存的内部节点
+        """
+        if hi == lo:
+            return None
+        if hi - lo == 1:
+            return self.leaves[self._paths[lo]]
+        return self.nodes[(level, index)]
+
+    def get_root(self) -> bytes:
+        """获取根哈希"""
+        root = self._subtree_hash(self.DEPTH, 0, 0, len(self._paths))
+        return self.empty_hashes()[self.DEPTH] if root is None else root
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """查询键对应的值"""
+        return self.values.get(self._path(key))
+
+    def update(self, key: bytes, value: Optional[bytes]) -> bytes:
+        """
+        更新单个键 (约 log2(n) 次哈希), 在有序路径列表中二分插入或删除
+        :param value: 新值, None 表示删除
+        :return: 新的根哈希
+        """
+        path = self._path(key)
+        paths = self._paths
+        pos = bisect.bisect_left(paths, path)
+        present = pos < len(paths) and paths[pos] == path
+        if value is None:
+            if present:
+                del paths[pos]
+        elif not present:
+            paths.insert(pos, path)
+        self._set_leaf(path, value)
+        self._rehash(self.DEPTH, 0, 0, len(paths), [path], 0, 1)
+        return self.get_root()
+
+    def update_many(self, items: List[Tuple[bytes, Optional[bytes]]]) -> bytes:
+        """
+        批量更新, 从根向下只进入含有改动路径的子树, 多个键共享的路径节点只计算一次
+        新增路径排序后与已有路径做一次线性归并, 整批为 O(n + k log k), 而不是每个键 O(n) 的列表插入
+        :param items: (键, 值) 列表, 值为 None 表示删除; 同一个键出现多次时以最后一次为准
+        :return: 新的根哈希
+        """
+        batch = {}
+        for key, value in items:
+            batch[self._path(key)] = value
+        if not batch:
+            return self.get_root()
+
+        inserts = []
+        deletes = set()
+        for path, value in batch.items():
+            if value is None:
+                if path in self.values:
+                    deletes.add(path)
+            elif path not in self.values:
+                inserts.append(path)
+            self._set_leaf(path, value)
+
+        if inserts or deletes:
+            inserts.sort()
+            merged = heapq.merge(self._paths, inserts)
+            if deletes:
+                self._paths = [p for p in merged if p not in deletes]
+            else:
+                self._paths = list(merged)
+
+        dirty = sorted(batch)
+        self._rehash(self.DEPTH, 0, 0, len(self._paths), dirty, 0, len(dirty))
+        return self.get_root()
+
+    def _set_leaf(self, path: int, value: Optional[bytes]) -> None:
+        """写入或删除路径上的值和叶子哈希 (不改动 _paths)"""
+        if value is None:
+            self.values.pop(path, None)
+            self.leaves.pop(path, None)
+        else:
+            self.values[path] = value
+            self.leaves[path] = self._leaf_hash(path, value)
+
+    def _rehash(self, level: int, index: int, lo: int, hi: int,
+                dirty: List[int], dlo: int, dhi: int) -> None:
+        """重算子树 (level, index) 中含改动路径 dirty[dlo:dhi] 的内部节点"""
+        nodes = self.nodes
+        if hi - lo < 2:
+            self._prune(level, index, dirty, dlo, dhi)
+            return
+
+        half = (2 * index + 1) << (level - 1)   # 右子树的第一条路径
+        mid = bisect.bisect_left(self._paths, half, lo, hi)
+        dmid = bisect.bisect_left(dirty, half, dlo, dhi)
+        if dlo < dmid:
+            self._rehash(level - 1, 2 * index, lo, mid, dirty, dlo, dmid)
+        if dmid < dhi:
+            self._rehash(level - 1, 2 * index + 1, mid, hi, dirty, dmid, dhi)
+
+        empty = self.empty_hashes()
+        left = self._subtree_hash(level - 1, 2 * index, lo, mid) or empty[level - 1]
+        right = self._subtree_hash(level - 1, 2 * index + 1, mid, hi) or empty[level - 1]
+        nodes[(level, index)] = sm3_hash(b'\x01' + left + right)
+
+    def _prune(self, level: int, index: int, dirty: List[int], dlo: int, dhi: int) -> None:
+        """
+        子树不足两个叶子时删除其中残留的内部节点
+        残留节点都在改动路径上, 且内部节点的祖先也是内部节点, 遇到不存在的节点即可停止
+        """
+        if level == 0 or self.nodes.pop((level, index), None) is None:
+            return
+        half = (2 * index + 1) << (level - 1)
+        dmid = bisect.bisect_left(dirty, half, dlo, dhi)
+        if dlo < dmid:
+            self._prune(level - 1, 2 * index, dirty, dlo, dmid)
+        if dmid < dhi:
+            self._prune(level - 1, 2 * index + 1, dirty, dmid, dhi)
+
+    def get_proof(self, key: bytes) -> Tuple[int, List[bytes], Optional[Tuple[int, bytes]]]:
+        """
+        成员/非成员证明
+        :return: (非空兄弟位图, 非空兄弟节点列表 (自底向上), 邻居叶子)
+                 空兄弟由验证方用预计算值补齐; 键不存在且其位置被另一个叶子独占时,
+                 邻居叶子为该叶子的 (路径, 值), 否则为 None
+        """
+        path = self._path(key)
+        paths = self._paths
+        level, index, lo, hi = self.DEPTH, 0, 0, len(paths)
+        found = []   # (层, 兄弟哈希), 自顶向下
+        while hi - lo >= 2:
+            half = (2 * index + 1) << (level - 1)
+            mid = bisect.bisect_left(paths, half, lo, hi)
+            level -= 1
+            if (path >> level) & 1:
+                sibling = self._subtree_hash(level, 2 * index, lo, mid)
+                index, lo = 2 * index + 1, mid
+            else:
+                sibling = self._subtree_hash(level, 2 * index + 1, mid, hi)
+                index, hi = 2 * index, mid
+            if sibling is not None:
+                found.append((level, sibling))
+
+        neighbour = None
+        if hi - lo == 1 and paths[lo] != path:
+            neighbour = (paths[lo], self.values[paths[lo]])
+        bitmap = 0
+        for l, _ in found:
+            bitmap |= 1 << l
+        return bitmap, [h for _, h in reversed(found)], neighbour
+
+    @staticmethod
+    def verify_proof(root: bytes, key: bytes, value: Optional[bytes],
+                     proof: Tuple[int, List[bytes], Optional[Tuple[int, bytes]]]) -> bool:
+        """
+        验证证明
+        :param value: 声称的值, None 表示证明键不存在
+        :param proof: get_proof 返回的证明
+        :return: 验证是否成功
+        """
+        bitmap, siblings, neighbour = proof
+        empty = SparseMerkleTree.empty_hashes()
+        path = SparseMerkleTree._path(key)
+        if value is not None:
+            if neighbour is not None:
+                return False
+            node = SparseMerkleTree._leaf_hash(path, value)
+        elif neighbour is not None:
+            # 邻居叶子独占包含本键位置的子树: 两条路径分叉处以下不能有兄弟
+            other, other_value = neighbour
+            if other == path or not 0 <= other < (1 << SparseMerkleTree.DEPTH):
+                return False
+            if bitmap & ((1 << (other ^ path).bit_length()) - 1):
+                return False
+            node = SparseMerkleTree._leaf_hash(other, other_value)
+        else:
+            node = None
+
+        lone = node is not None   # 当前子树只含一个叶子时哈希直接上浮
+        it = iter(siblings)
+        try:
+            for level in range(SparseMerkleTree.DEPTH):
+                sibling = next(it) if (bitmap >> level) & 1 else None
+                if sibling is None:
+                    if node is None or lone:
+                        continue  # 仍为空子树, 或单叶子子树上浮
+                    sibling = empty[level]
+                elif node is None:
+                    node = empty[level]
+                lone = False
+                if (path >> level) & 1:
+                    node = sm3_hash(b'\x01' + sibling + node)
+                else:
+                    node = sm3_hash(b'\x01' + node + sibling)
+        except StopIteration:
+            return False
+
+        return next(it, None) is None and (node or empty[SparseMerkleTree.DEPTH]) == root
+
+
 # ====================== 测试函数 ======================
 def test_sm3():
     """测试 SM3 实现"""
-    # 测试向量
-    test_vectors = [
-        (b"", "1ab21d8355cfa17f8e61194831e81a8f22bec8c728fefb747ed035eb5082aa2b"),
-        (b"abc", "66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0"),
-        (b"abcd" * 16, "debe9ff92275b8a138604889c18e5a4d6fdb70e5387e5765293dcba39c0c5732")
-    ]
-
     print("测试 SM3 实现:")
-    for msg, expected in test_vectors:
+    for msg, expected in SM3_TEST_VECTORS:
         digest = SM3.hash(msg).hex()
         status = "通过" if digest == expected else f"失败 (期望: {expected})"
         print(f"消息: {msg[:10]}... 哈希: {digest} {status}")
+
+    # 流式接口: 分块 update 与一次性哈希结果一致
+    msg = bytes(range(256)) * 5
+    h = SM3()
+    for i in range(0, len(msg), 37):
+        h.update(msg[i:i + 37])
+    prefix = SM3(msg[:100])
+    forked = prefix.copy()
+    forked.update(msg[100:])
+    ok = h.digest() == SM3.hash(msg) == forked.digest() == SM3.hash_file(io.BytesIO(msg), 64)
+    print(f"流式接口 (update/copy/hash_file): {'通过' if ok else '失败'}")
+
+    # 批量接口: 与逐条计算结果一致
+    msgs = [os.urandom(i % 150) for i in range(300)]
+    ok = SM3.hash_many(msgs) == [SM3.hash(m) for m in msgs]
+    print(f"批量接口 (hash_many): {'通过' if ok else '失败'}")
+
+    # 当前后端与纯 Python 实现交叉验证
+    ok = sm3_hash_many(msgs) == [SM3.hash(m) for m in msgs]
+    print(f"当前后端: {sm3_backend.name} 交叉验证: {'通过' if ok else '失败'}")
     print()
 
 
@@ -336,6 +1797,25 @@ def test_length_extension_attack():
     print()
 
 
+def test_hmac_sm3():
+    """测试 HMAC-SM3"""
+    print("测试 HMAC-SM3:")
+    msg = b"GET /api/v1/orders?limit=10"
+    ok = True
+    for key in (b"short key", os.urandom(64), os.urandom(100)):
+        mac = HMACSM3(key)
+        tag = mac.mac(msg)
+
+        # 与不缓存中间状态的朴素实现比较
+        k = sm3_hash(key) if len(key) > 64 else key
+        k = k.ljust(64, b'\x00')
+        naive = SM3.hash(bytes(x ^ 0x5c for x in k) +
+                         SM3.hash(bytes(x ^ 0x36 for x in k) + msg))
+        ok = ok and tag == naive and mac.verify(msg, tag) and not mac.verify(msg + b"x", tag)
+    print(f"HMAC-SM3 验证: {'通过' if ok else '失败'}")
+    print()
+
+
 def test_merkle_tree():
     """测试 Merkle 树"""
     # 生成 10 个叶子节点 (测试用)
@@ -343,6 +1823,13 @@ def test_merkle_tree():
     print(f"构建 Merkle 树 ({leaf_count} 个叶子节点)...")
     data = [os.urandom(32) for _ in range(leaf_count)]
     tree = MerkleTree(data)
+    print(tree.format_build_stats())
+
+    # 多进程并行构建与串行构建逐位一致
+    parallel = MerkleTree.build_parallel(data, workers=2, chunk_size=4)
+    same = parallel.get_root() == tree.get_root() and \
+        [bytes(level.data) for level in parallel.tree] == [bytes(level.data) for level in tree.tree]
+    print(f"并行构建与串行构建一致: {'通过' if same else '失败'}")
 
     # 存在性证明
     index = 3
@@ -359,9 +1846,137 @@ def test_merkle_tree():
     )
     print(f"不存在性证明验证: {'通过' if valid else '失败'}")
 
+    # 紧凑二进制证明: 解析后直接验证
+    encoded = tree.inclusion_proof_bytes(index)
+    packed = PackedProof(encoded)
+    valid = packed.index == index and MerkleTree.verify_inclusion(tree.get_root(), data[index], packed.index, packed)
+    hex_size = sum(len(bytes(h).hex()) + 6 for h, _ in tree.inclusion_proof(index))
+    print(f"紧凑二进制证明验证 ({len(encoded)} 字节, 十六进制约 {hex_size} 字节): "
+          f"{'通过' if valid else '失败'}")
+
+    # 带缓存的验证器: 共享的上层节点只认证一次
+    verifier = InclusionVerifier(tree.get_root(), leaf_count)
+    valid = all(verifier.verify(data[i], i, tree.inclusion_proof(i)) for i in range(leaf_count))
+    valid = valid and not verifier.verify(os.urandom(32), index, tree.inclusion_proof(index))
+    st = verifier.stats()
+    print(f"缓存验证器验证: {'通过' if valid else '失败'} "
+          f"(命中 {st['hits']}, 未命中 {st['misses']}, 哈希 {st['hashes']} 次)")
+
+    # 保存到磁盘后以 mmap 方式打开
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'merkle.bin')
+        tree.save(path)
+        mapped = MerkleTree.open(path)
+        valid = mapped.get_root() == tree.get_root() and MerkleTree.verify_inclusion(
+            mapped.get_root(), data[index], index, mapped.inclusion_proof(index))
+        mapped.close()
+    print(f"磁盘格式 (mmap 打开) 验证: {'通过' if valid else '失败'}")
+
+    # 批量存在性证明: 共享的上层节点只出现一次
+    indices = [1, 2, 3, 7]
+    proof = tree.multi_inclusion_proof(indices)
+    valid = MerkleTree.verify_multi_inclusion(
+        tree.get_root(), [data[i] for i in indices], indices, leaf_count, proof
+    )
+    single = sum(len(tree.inclusion_proof(i)) for i in indices)
+    print(f"批量存在性证明验证 ({len(proof)} 个节点, 逐个证明需 {single} 个): {'通过' if valid else '失败'}")
+
+    # 一致性证明: 前 m 个叶子的树是当前树的前缀
+    m = 6
+    old_root = MerkleTree(data[:m]).get_root()
+    proof = tree.consistency_proof(m)
+    valid = MerkleTree.verify_consistency(old_root, tree.get_root(), m, leaf_count, proof)
+    print(f"一致性证明验证 ({m} -> {leaf_count}, {len(proof)} 个节点): {'通过' if valid else '失败'}")
+
+
+def test_sorted_merkle_tree():
+    """测试有序叶子 Merkle 树的不存在性证明"""
+    print("测试有序叶子 Merkle 树:")
+    leaf_count = 100
+    data = [os.urandom(32) for _ in range(leaf_count)]
+    tree = SortedMerkleTree(data)
+
+    target = os.urandom(32)
+    left, right = tree.non_inclusion_proof(target)
+    valid = SortedMerkleTree.verify_non_inclusion(tree.get_root(), target, leaf_count, left, right)
+    print(f"不存在性证明验证: {'通过' if valid else '失败'}")
+
+    # 用已存在的叶子伪造证明必须失败
+    pos, found = tree.find(data[0])
+    forged = SortedMerkleTree.verify_non_inclusion(
+        tree.get_root(), data[0], leaf_count,
+        (pos - 1, tree.data[pos - 1], tree.inclusion_proof(pos - 1)) if pos > 0 else None,
+        (pos + 1, tree.data[pos + 1], tree.inclusion_proof(pos + 1)) if pos + 1 < leaf_count else None
+    )
+    print(f"已存在叶子: {'存在' if found else '不存在'}, 伪造证明被拒绝: {'通过' if not forged else '失败'}")
+    print()
+
+
+def test_merkle_log():
+    """测试追加式 Merkle 日志"""
+    print("测试追加式 Merkle 日志:")
+    data = [os.urandom(16) for _ in range(40)]
+    log = MerkleLog()
+    ok = log.get_root() == MerkleTree([]).get_root()
+    for i, d in enumerate(data):
+        log.append(d)
+        ok = ok and log.root() == MerkleTree(data[:i + 1]).get_root()
+    print(f"每次追加后的根与完整重建一致: {'通过' if ok else '失败'}")
+
+    # 流式计算根哈希: 从文件按定长记录读取
+    records = [os.urandom(32) for _ in range(1000)]
+    root = merkle_root(read_records(io.BytesIO(b''.join(records)), 32))
+    print(f"流式根哈希与完整构建一致: {'通过' if root == MerkleTree(records).get_root() else '失败'}")
+
+    # 纯 Python 后端: 不对齐的开头 + 整批子树 + 不足一批的末尾
+    saved = sm3_backend
+    set_sm3_backend(_python_backend())
+    try:
+        records = [os.urandom(8) for _ in range(5 + 2 * MerkleLog.BATCH + 100)]
+        log = MerkleLog(records[:5])
+        log.extend(iter(records[5:]))
+        ok = log.size == len(records) and log.root() == MerkleTree(records).get_root()
+    finally:
+        set_sm3_backend(saved)
+    print(f"纯 Python 后端整批子树与完整构建一致: {'通过' if ok else '失败'}")
+    print()
+
+
+def test_sparse_merkle_tree():
+    """测试稀疏 Merkle 树"""
+    print("测试稀疏 Merkle 树:")
+    smt = SparseMerkleTree()
+    items = [(f"user{i}".encode(), os.urandom(16)) for i in range(20)]
+    smt.update_many(items[:10])
+    for key, value in items[10:]:
+        smt.update(key, value)
+
+    # 批量更新与逐个更新得到相同的根
+    other = SparseMerkleTree()
+    other.update_many(items[::-1])
+    print(f"批量更新与逐个更新一致: {'通过' if other.get_root() == smt.get_root() else '失败'}")
+
+    key, value = items[3]
+    valid = SparseMerkleTree.verify_proof(smt.get_root(), key, value, smt.get_proof(key))
+    print(f"成员证明验证: {'通过' if valid else '失败'}")
+
+    missing = b"nobody"
+    valid = SparseMerkleTree.verify_proof(smt.get_root(), missing, None, smt.get_proof(missing))
+    print(f"非成员证明验证: {'通过' if valid else '失败'}")
+
+    # 删除所有键后回到空树
+    smt.update_many([(k, None) for k, _ in items])
+    empty_root = SparseMerkleTree.empty_hashes()[SparseMerkleTree.DEPTH]
+    print(f"删除后恢复空树: {'通过' if smt.get_root() == empty_root and not smt.nodes else '失败'}")
+    print()
+
 
 # ====================== 主函数 ======================
 if __name__ == "__main__":
     test_sm3()
     test_length_extension_attack()
-    test_merkle_tree()
\ No newline at end of file
+    test_hmac_sm3()
+    test_merkle_tree()
+    test_sorted_merkle_tree()
+    test_merkle_log()
+    test_sparse_merkle_tree()
\ No newline at end of file
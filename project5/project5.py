@@ -3,10 +3,14 @@ SM2 国密算法完整实现
 包含：基础算法、性能优化、安全漏洞验证
 """
 
+import asyncio
 import os
 import hashlib
 import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 # 全局配置
 ENABLE_COLOR = True  # 彩色输出开关
@@ -78,9 +82,36 @@ def int_to_bytes(num):
     return num.to_bytes(byte_length, 'big')
 
 
+SM3_ABC_DIGEST = bytes.fromhex('66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0')
+
+
+def _load_sm3():
+    """
+    选择 SM3 实现: project4 在导入路径上时复用其后端层 (原生 OpenSSL 优先, 纯 Python SM3 兜底,
+    启用前均用测试向量交叉验证); 否则使用通过测试向量的 OpenSSL SM3; 都不可用时报错,
+    不退回其他哈希算法, 以免 Z_A 和 e 随部署方式变化
+    """
+    try:
+        from project4 import sm3_hash
+        return sm3_hash
+    except ImportError:
+        pass
+    try:
+        hashlib.new('sm3')
+    except ValueError:
+        raise ImportError("SM3 不可用: 请把 project4 加入 PYTHONPATH 或使用支持 SM3 的 OpenSSL") from None
+    sm3_hash = lambda data: hashlib.new('sm3', data).digest()
+    if sm3_hash(b'abc') != SM3_ABC_DIGEST:
+        raise ImportError("OpenSSL SM3 未通过测试向量")
+    return sm3_hash
+
+
+_sm3_hash = _load_sm3()
+
+
 def hash_sm3(data):
     """SM3哈希算法实现"""
-    return hashlib.sha256(data).digest()
+    return _sm3_hash(data)
 
 
 def format_hex(value, width=64):
@@ -128,116 +159,1094 @@ class ECPoint:
         return ECPoint(x3, y3)
 
     def __rmul__(self, scalar):
-        """标量乘法优化"""
+        """标量乘法 (wNAF, Jacobian 坐标)"""
         if scalar == 0 or self.is_infinity():
             return ECPoint(None, None)
-        if scalar < 0:
-            return (-scalar) * ECPoint(self.x, -self.y % P)
 
-        result = ECPoint(None, None)
-        current = self
+        return jacobian_to_affine(wnaf_jacobian(scalar, self.x, self.y))
+
+
+
+# Jacobian 坐标运算
+# (X, Y, Z) 表示仿射点 (X/Z^2, Y/Z^3), Z == 0 表示无穷远点
+# 点加与倍点都不需要求逆, 只在转换回仿射坐标时求一次逆
+
+JACOBIAN_INFINITY = (1, 1, 0)
+
+
+def jacobian_double(pt):
+    """倍点 (利用 a = -3: M = 3(X - Z^2)(X + Z^2))"""
+    X1, Y1, Z1 = pt
+    if Z1 == 0 or Y1 == 0:
+        return JACOBIAN_INFINITY
+    ZZ = Z1 * Z1 % P
+    M = 3 * (X1 - ZZ) * (X1 + ZZ) % P
+    YY = Y1 * Y1 % P
+    S = 4 * X1 * YY % P
+    X3 = (M * M - 2 * S) % P
+    Y3 = (M * (S - X3) - 8 * YY * YY) % P
+    Z3 = 2 * Y1 * Z1 % P
+    return X3, Y3, Z3
+
+
+def jacobian_add_mixed(pt, x2, y2):
+    """混合点加: Jacobian 点 + 仿射点 (x2, y2)"""
+    X1, Y1, Z1 = pt
+    if Z1 == 0:
+        return x2, y2, 1
+    Z1Z1 = Z1 * Z1 % P
+    U2 = x2 * Z1Z1 % P
+    S2 = y2 * Z1 * Z1Z1 % P
+    H = (U2 - X1) % P
+    R = (S2 - Y1) % P
+    if H == 0:
+        return jacobian_double(pt) if R == 0 else JACOBIAN_INFINITY
+    HH = H * H % P
+    HHH = H * HH % P
+    V = X1 * HH % P
+    X3 = (R * R - HHH - 2 * V) % P
+    Y3 = (R * (V - X3) - Y1 * HHH) % P
+    Z3 = Z1 * H % P
+    return X3, Y3, Z3
+
+
+def jacobian_add(pt1, pt2):
+    """一般点加: 两个 Jacobian 点"""
+    X1, Y1, Z1 = pt1
+    X2, Y2, Z2 = pt2
+    if Z1 == 0:
+        return pt2
+    if Z2 == 0:
+        return pt1
+    Z1Z1 = Z1 * Z1 % P
+    Z2Z2 = Z2 * Z2 % P
+    U1 = X1 * Z2Z2 % P
+    U2 = X2 * Z1Z1 % P
+    S1 = Y1 * Z2 * Z2Z2 % P
+    S2 = Y2 * Z1 * Z1Z1 % P
+    H = (U2 - U1) % P
+    R = (S2 - S1) % P
+    if H == 0:
+        return jacobian_double(pt1) if R == 0 else JACOBIAN_INFINITY
+    HH = H * H % P
+    HHH = H * HH % P
+    V = U1 * HH % P
+    X3 = (R * R - HHH - 2 * V) % P
+    Y3 = (R * (V - X3) - S1 * HHH) % P
+    Z3 = Z1 * Z2 * H % P
+    return X3, Y3, Z3
+
+
+def jacobian_to_affine(pt):
+    """转换回仿射坐标 (一次求逆)"""
+    X, Y, Z = pt
+    if Z == 0:
+        return ECPoint(None, None)
+    z_inv = mod_inv(Z, P)
+    z_inv2 = z_inv * z_inv % P
+    return ECPoint(X * z_inv2 % P, Y * z_inv2 * z_inv % P)
+
+
+def jacobian_batch_to_affine(points):
+    """
+    批量转换回仿射坐标, 所有点共用一次求逆 (Montgomery 同时求逆技巧)
+    :param points: Jacobian 点列表
+    :return: (x, y) 列表, 无穷远点对应 None
+    """
+    # 前缀积: prefix[i] = Z_0 * ... * Z_{i-1} (跳过无穷远点)
+    prefix = []
+    acc = 1
+    for _, _, Z in points:
+        prefix.append(acc)
+        if Z:
+            acc = acc * Z % P
+
+    inv = mod_inv(acc, P)
+    result = [None] * len(points)
+    for i in range(len(points) - 1, -1, -1):
+        X, Y, Z = points[i]
+        if not Z:
+            continue
+        z_inv = inv * prefix[i] % P   # 1 / Z_i
+        inv = inv * Z % P             # 去掉 Z_i, 留给前面的点
+        z_inv2 = z_inv * z_inv % P
+        result[i] = (X * z_inv2 % P, Y * z_inv2 * z_inv % P)
+    return result
+
+
+def affine_batch_add(acc, points):
+    """
+    批量仿射点加 acc[i] += points[i] (原地修改), 所有点加的分母共用一次求逆
+    每次点加只需几次乘法, 适合大量标量乘法同步推进
+    :param acc: (x, y) 列表, None 表示无穷远点
+    :param points: 与 acc 等长的 (x, y) 列表, None 表示跳过
+    """
+    index = []
+    denominators = []
+    for i, pt in enumerate(points):
+        if pt is None:
+            continue
+        cur = acc[i]
+        if cur is None:
+            acc[i] = pt
+        elif cur[0] == pt[0]:
+            # 相同点或互为相反点, 单独处理
+            if cur[1] == pt[1]:
+                doubled = jacobian_to_affine(jacobian_double((cur[0], cur[1], 1)))
+                acc[i] = (doubled.x, doubled.y)
+            else:
+                acc[i] = None
+        else:
+            index.append(i)
+            denominators.append((pt[0] - cur[0]) % P)
+    if not index:
+        return
+
+    prefix = []
+    product = 1
+    for d in denominators:
+        prefix.append(product)
+        product = product * d % P
+    inv = mod_inv(product, P)
+    for j in range(len(index) - 1, -1, -1):
+        i = index[j]
+        d_inv = inv * prefix[j] % P
+        inv = inv * denominators[j] % P
+        x1, y1 = acc[i]
+        x2, y2 = points[i]
+        lam = (y2 - y1) * d_inv % P
+        x3 = (lam * lam - x1 - x2) % P
+        acc[i] = (x3, (lam * (x1 - x3) - y1) % P)
+
+
+# wNAF 标量乘法
+# 奇数倍点表只存 P, 3P, ..., (2^(w-1)-1)P, 负数位取表项的相反点 (x, -y), 表长减半
+
+# 混合点加, 一般点加, 倍点, 求逆, 批量转换每点的实测耗时 (us)
+NAF_WINDOW_COSTS = (8.0, 15.0, 6.0, 100.0, 1.5)
+
+
+def choose_naf_window(bits):
+    """
+    按代价模型为 bits 位标量选择窗口宽度
+    预计算: 一次倍点 + 2^(w-2) - 1 次点加 + 一次求逆; 主循环: bits 次倍点 + 约 bits/(w+1) 次点加
+    """
+    add, general_add, dbl, inv, norm = NAF_WINDOW_COSTS
+    best_w, best_cost = 2, None
+    for w in range(2, 9):
+        size = 1 << (w - 2)
+        precompute = dbl + (size - 1) * general_add + inv + size * norm if size > 1 else 0
+        cost = precompute + bits * dbl + bits / (w + 1) * add
+        if best_cost is None or cost < best_cost:
+            best_w, best_cost = w, cost
+    return best_w
+
+
+def wnaf(k, w):
+    """
+    宽度 w 的 NAF 表示 (低位在前)
+    非零位都是奇数且 |d| < 2^(w-1), 任意连续 w 位中最多一个非零位
+    """
+    digits = []
+    window = 1 << w
+    half = window >> 1
+    while k:
+        if k & 1:
+            d = k & (window - 1)
+            if d >= half:
+                d -= window
+            k -= d
+        else:
+            d = 0
+        digits.append(d)
+        k >>= 1
+    return digits
+
+
+def odd_multiples_jacobian(x, y, w):
+    """奇数倍点表 [P, 3P, 5P, ..., (2^(w-1)-1)P] (Jacobian 坐标, 多个表可以合并后一起转换)"""
+    pt = (x, y, 1)
+    if w == 2:
+        return [pt]
+    twice = jacobian_double(pt)
+    points = [pt]
+    for _ in range((1 << (w - 2)) - 1):
+        points.append(jacobian_add(points[-1], twice))
+    return points
+
+
+def odd_multiples(x, y, w):
+    """奇数倍点表 [P, 3P, 5P, ..., (2^(w-1)-1)P] (仿射坐标, 批量转换只求一次逆)"""
+    if w == 2:
+        return [(x, y)]
+    return jacobian_batch_to_affine(odd_multiples_jacobian(x, y, w))
+
+
+def wnaf_jacobian(k, x, y, w=None):
+    """
+    wNAF 标量乘法, 基点 (x, y) 为仿射坐标
+    :param w: 窗口宽度 (>= 2), 默认按标量位数由 choose_naf_window 选择
+    :return: k * (x, y), Jacobian 点
+    """
+    k %= N
+    if k == 0:
+        return JACOBIAN_INFINITY
+    if w is None:
+        w = choose_naf_window(k.bit_length())
+    table = odd_multiples(x, y, w)
+    digits = wnaf(k, w)
+
+    # 最高位非零, 直接从对应表项开始, 省去对无穷远点的倍点
+    tx, ty = table[digits[-1] >> 1]
+    result = (tx, ty, 1)
+    for i in range(len(digits) - 2, -1, -1):
+        result = jacobian_double(result)
+        d = digits[i]
+        if d > 0:
+            tx, ty = table[d >> 1]
+            result = jacobian_add_mixed(result, tx, ty)
+        elif d < 0:
+            tx, ty = table[(-d) >> 1]
+            result = jacobian_add_mixed(result, tx, P - ty)
+    return result
+
+
+
+# 基点 G 的固定基预计算表
+# table[i][j] = j * 2^(w*i) * G (仿射坐标), k*G 只需每个窗口一次查表和一次混合点加, 不需要倍点
+
+G_TABLE_WINDOW = 8  # 窗口宽度 (>= 2), 8 时共 32 个窗口, 每次 k*G 最多 32 次点加
+G_TABLE_CACHE = os.environ.get('SM2_G_TABLE_CACHE')  # 设置后把表缓存到该文件
+G_TABLE_MAGIC = b'SM2GTBL1'
+
+_g_table = None
+
+
+def build_fixed_base_table(x, y, w):
+    """
+    计算点 (x, y) 的固定基预计算表 table[i][j] = j * 2^(w*i) * (x, y)
+    在 Jacobian 坐标下计算, 最后批量转换为仿射坐标
+    """
+    windows = (N.bit_length() + w - 1) // w
+    points = []
+    base = (x, y, 1)
+    for _ in range(windows):
+        acc = base
+        points.append(acc)
+        for _ in range(2, 1 << w):
+            acc = jacobian_add(acc, base)
+            points.append(acc)
+        for _ in range(w):
+            base = jacobian_double(base)
+
+    affine = jacobian_batch_to_affine(points)
+    size = (1 << w) - 1
+    return [[None] + affine[i * size:(i + 1) * size] for i in range(windows)]
+
+
+def _build_g_table(w):
+    """计算 G 的预计算表"""
+    return build_fixed_base_table(GX, GY, w)
+
+
+def _is_on_curve(x, y):
+    return (y * y - (x * x * x + A * x + B)) % P == 0
+
+
+def _is_affine_sum(a, b, c):
+    """
+    检查仿射点 c == a + b (三点都已确认在曲线上), 用交叉相乘代替斜率中的求逆
+    a == b 时按切线 (倍点) 公式检查
+    """
+    (x1, y1), (x2, y2), (x3, y3) = a, b, c
+    if x1 == x2:
+        if y1 != y2 or y1 == 0:
+            return False    # a == -b, 和为无穷远点
+        num, den = (3 * x1 * x1 + A) % P, 2 * y1 % P
+    else:
+        num, den = (y2 - y1) % P, (x2 - x1) % P
+    # lambda = num / den: x3 = lambda^2 - x1 - x2, y3 = lambda * (x1 - x3) - y1
+    return ((x3 + x1 + x2) * den * den - num * num) % P == 0 and \
+        ((y3 + y1) * den - num * (x1 - x3)) % P == 0
+
+
+def _check_g_table(table, w):
+    """
+    检查从磁盘读入的表: 所有点在曲线上, 各窗口的基点依次相差 2^w 倍, 窗口内每一项都等于前一项加基点
+    逐项检查不需要求逆, 比重新建表快得多
+    """
+    if not table or table[0][1] != (GX, GY):
+        return False
+    if any(not (0 <= x < P and 0 <= y < P and _is_on_curve(x, y)) for row in table for x, y in row[1:]):
+        return False
+    def same(pt, x, y):
+        # Jacobian 点与仿射点比较, 不需要求逆
+        X, Y, Z = pt
+        return Z != 0 and (X - x * Z * Z) % P == 0 and (Y - y * Z * Z * Z) % P == 0
+
+    for i, row in enumerate(table):
+        base = row[1]
+        for j in range(2, len(row)):
+            if not _is_affine_sum(row[j - 1], base, row[j]):
+                return False
+        if i + 1 < len(table):
+            pt = (base[0], base[1], 1)
+            for _ in range(w):
+                pt = jacobian_double(pt)
+            if not same(pt, *table[i + 1][1]):
+                return False
+    return True
+
+
+def _load_g_table(path, w):
+    """从磁盘读取预计算表, 格式或内容不符时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if data[:8] != G_TABLE_MAGIC or len(data) < 9 or data[8] != w:
+        return None
+    windows = (N.bit_length() + w - 1) // w
+    size = (1 << w) - 1
+    body = data[9:]
+    if len(body) != windows * size * 64:
+        return None
+    coords = [bytes_to_int(body[i:i + 32]) for i in range(0, len(body), 32)]
+    points = list(zip(coords[0::2], coords[1::2]))
+    table = [[None] + points[i * size:(i + 1) * size] for i in range(windows)]
+    return table if _check_g_table(table, w) else None
+
+
+def _save_g_table(path, table, w):
+    """把预计算表写入磁盘 (先写临时文件再替换)"""
+    body = b''.join(x.to_bytes(32, 'big') + y.to_bytes(32, 'big') for row in table for x, y in row[1:])
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(G_TABLE_MAGIC + bytes([w]) + body)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def get_g_table():
+    """进程内共享的 G 预计算表, 首次使用时构建 (配置了缓存文件时优先从磁盘读取)"""
+    global _g_table
+    if _g_table is None:
+        w = G_TABLE_WINDOW
+        table = _load_g_table(G_TABLE_CACHE, w) if G_TABLE_CACHE else None
+        if table is None:
+            table = _build_g_table(w)
+            if G_TABLE_CACHE:
+                _save_g_table(G_TABLE_CACHE, table, w)
+        _g_table = table
+    return _g_table
+
+
+def fixed_table_jacobian(terms):
+    """
+    查表计算 sum(k_i * P_i), 全部累加到同一个 Jacobian 点, 不需要倍点
+    :param terms: [(k, 预计算表, w), ...], 表由 build_fixed_base_table 生成
+    """
+    result = JACOBIAN_INFINITY
+    for k, table, w in terms:
+        k %= N
+        mask = (1 << w) - 1
+        i = 0
+        while k:
+            digit = k & mask
+            if digit:
+                result = jacobian_add_mixed(result, *table[i][digit])
+            k >>= w
+            i += 1
+    return result
+
+
+def fixed_base_jacobian(k):
+    """k*G, 返回 Jacobian 点"""
+    return fixed_table_jacobian([(k, get_g_table(), G_TABLE_WINDOW)])
+
+
+def fixed_base_mul(k):
+    """固定基标量乘法 k*G"""
+    return jacobian_to_affine(fixed_base_jacobian(k))
+
+
+
+# 多标量乘法 (Straus/Shamir 交错 wNAF)
+# 多个 k_i * P_i 共用一条倍点链, 每个标量按各自的 wNAF 在对应位置加上奇数倍点
 
-        while scalar:
-            if scalar & 1:
-                result = result + current
-            current = current + current
-            scalar >>= 1
+G_NAF_WINDOW = 7   # G 的奇数倍点表只算一次, 可以用更宽的窗口
+NAF_WINDOW = 5     # 临时点 (如公钥) 的窗口宽度
 
-        return result
+_g_naf_table = None
+
+
+def get_g_naf_table():
+    """进程内共享的 G 奇数倍点表"""
+    global _g_naf_table
+    if _g_naf_table is None:
+        _g_naf_table = odd_multiples(GX, GY, G_NAF_WINDOW)
+    return _g_naf_table
+
+
+def multi_scalar_jacobian(terms):
+    """
+    交错 wNAF 多标量乘法
+    :param terms: [(k, 奇数倍点表, w), ...], 表由 odd_multiples 生成
+    :return: sum(k_i * P_i), Jacobian 点
+    """
+    # 先把所有标量的非零位合并成按位排列的加点计划, 主循环只做倍点和点加
+    schedule = []
+    for k, table, w in terms:
+        for i, d in enumerate(wnaf(k % N, w)):
+            if not d:
+                continue
+            while len(schedule) <= i:
+                schedule.append([])
+            if d > 0:
+                schedule[i].append(table[d >> 1])
+            else:
+                x, y = table[(-d) >> 1]
+                schedule[i].append((x, P - y))
+
+    result = JACOBIAN_INFINITY
+    for adds in reversed(schedule):
+        result = jacobian_double(result)
+        for x, y in adds:
+            result = jacobian_add_mixed(result, x, y)
+    return result
+
+
+def multi_scalar_mul(terms):
+    """
+    多标量乘法 sum(k_i * P_i)
+    :param terms: [(k, ECPoint), ...], 基点 G 自动使用共享的预计算表
+    """
+    prepared = []
+    for k, point in terms:
+        if point.is_infinity():
+            continue
+        if point.x == GX and point.y == GY:
+            prepared.append((k, get_g_naf_table(), G_NAF_WINDOW))
+        else:
+            prepared.append((k, odd_multiples(point.x, point.y, NAF_WINDOW), NAF_WINDOW))
+    return jacobian_to_affine(multi_scalar_jacobian(prepared))
 
 
 
 # SM2 核心算法
 
 def sm2_key_gen():
-    """密钥对生成"""
-    dA = bytes_to_int(os.urandom(32)) % (N - 1) + 1
-    G = ECPoint(GX, GY)
-    PA = dA * G
+    """密钥对生成 (私钥取值范围 [1, n-2])"""
+    dA = bytes_to_int(os.urandom(32)) % (N - 2) + 1
+    PA = fixed_base_mul(dA)
     return dA, PA
 
 
-def sm2_sign(dA, msg, ZA=b"DefaultID"):
-    """签名算法"""
+def sm2_key_gen_batch(n):
+    """
+    批量生成密钥对
+    所有公钥按 G 的固定基预计算表逐窗口同步累加, 每个窗口的 n 次仿射点加共用一次求逆 (Montgomery 同时求逆),
+    整批只需 256/G_TABLE_WINDOW 次求逆, 与 n 无关
+    :param n: 密钥对数量
+    :return: [(私钥, 压缩公钥), ...]
+    """
+    seed = os.urandom(32 * n)
+    private_keys = [bytes_to_int(seed[i:i + 32]) % (N - 2) + 1 for i in range(0, 32 * n, 32)]
+
+    table = get_g_table()
+    w = G_TABLE_WINDOW
+    mask = (1 << w) - 1
+    public_keys = [None] * n
+    for i, row in enumerate(table):
+        shift = w * i
+        affine_batch_add(public_keys, [row[(dA >> shift) & mask] for dA in private_keys])
+    return [(dA, compress_pubkey(ECPoint(x, y))) for dA, (x, y) in zip(private_keys, public_keys)]
+
+
+def sm2_za(ZA=b"DefaultID"):
+    """用户标识杂凑值 Z_A = H(ENTL || ID || a || b || xG || yG)"""
     entl = len(ZA) * 8
     za_data = int_to_bytes(entl) + ZA + int_to_bytes(A) + int_to_bytes(B) + int_to_bytes(GX) + int_to_bytes(GY)
-    ZA_hash = hash_sm3(za_data)
+    return hash_sm3(za_data)
 
-    M = ZA_hash + msg
-    e = bytes_to_int(hash_sm3(M)) % N
 
-    k = bytes_to_int(os.urandom(32)) % (N - 1) + 1
+def sm2_digest(za_hash, msg):
+    """消息摘要 e = H(Z_A || M) mod n"""
+    return bytes_to_int(hash_sm3(za_hash + msg)) % N
 
-    G_point = ECPoint(GX, GY)
-    kG = k * G_point
-    x1 = kG.x
 
-    r = (e + x1) % N
-    if r == 0 or r + k == N:
-        return sm2_sign(dA, msg, ZA)
+def _sign_digest(dA, d_inv, e):
+    """
+    对摘要 e 签名
+    :param d_inv: (1 + dA)^-1 mod n
+    """
+    while True:
+        k = bytes_to_int(os.urandom(32)) % (N - 1) + 1
+        x1 = fixed_base_mul(k).x
 
-    s = mod_inv(1 + dA, N) * (k - r * dA) % N
-    if s == 0:
-        return sm2_sign(dA, msg, ZA)
+        r = (e + x1) % N
+        if r == 0 or r + k == N:
+            continue
 
-    return r, s
+        s = d_inv * (k - r * dA) % N
+        if s != 0:
+            return r, s
 
 
-def sm2_verify(PA, msg, signature, ZA=b"DefaultID"):
-    """签名验证"""
+def _x_matches(pt, r, e):
+    """
+    检查 (e + x(pt)) mod n == r, pt 为 Jacobian 点
+    x(pt) = X/Z^2, 逐个候选 x1 ≡ r - e (mod n) 比较 X == x1 * Z^2, 不需要求逆
+    """
+    X, _, Z = pt
+    if Z == 0:
+        return False
+    ZZ = Z * Z % P
+    x1 = (r - e) % N
+    while x1 < P:   # p > n, x1 + n 仍可能是合法的 x 坐标
+        if (X - x1 * ZZ) % P == 0:
+            return True
+        x1 += N
+    return False
+
+
+def _verify_digest(e, signature, pa_table, w, pa_comb=None):
+    """
+    验证摘要 e 的签名
+    :param pa_table: 公钥的奇数倍点表 (odd_multiples 生成), w 为其窗口宽度
+    :param pa_comb: 公钥的固定基预计算表 (窗口宽度 PA_COMB_WINDOW), 提供时 sG + tPA 全部查表完成
+    """
     r, s = signature
     if not (0 < r < N) or not (0 < s < N):
         return False
 
-    entl = len(ZA) * 8
-    za_data = int_to_bytes(entl) + ZA + int_to_bytes(A) + int_to_bytes(B) + int_to_bytes(GX) + int_to_bytes(GY)
-    ZA_hash = hash_sm3(za_data)
-
-    M = ZA_hash + msg
-    e = bytes_to_int(hash_sm3(M)) % N
-
     t = (r + s) % N
     if t == 0:
         return False
 
-    G_point = ECPoint(GX, GY)
-    sG = s * G_point
-    tPA = t * PA
-    point = sG + tPA
+    if pa_comb is not None:
+        point = fixed_table_jacobian([(s, get_g_table(), G_TABLE_WINDOW), (t, pa_comb, PA_COMB_WINDOW)])
+    else:
+        # sG + tPA 共用一条倍点链
+        point = multi_scalar_jacobian([(s, get_g_naf_table(), G_NAF_WINDOW), (t, pa_table, w)])
+    return _x_matches(point, r, e)
 
-    R = (e + point.x) % N
-    return R == r
 
+def sm2_sign(dA, msg, ZA=b"DefaultID"):
+    """签名算法"""
+    e = sm2_digest(sm2_za(ZA), msg)
+    return _sign_digest(dA, mod_inv(1 + dA, N), e)
 
 
-# 性能优化技术
+def sm2_verify(PA, msg, signature, ZA=b"DefaultID"):
+    """签名验证"""
+    if PA.is_infinity():
+        return False
+    e = sm2_digest(sm2_za(ZA), msg)
+    return _verify_digest(e, signature, odd_multiples(PA.x, PA.y, NAF_WINDOW), NAF_WINDOW)
+
+
+
+# SM2 签名/验签上下文
+# 同一身份反复签名或验签时, Z_A, (1 + dA)^-1 和公钥倍点表只算一次
+# 验签次数达到 HOT_VERIFIER_USES 的公钥升级为固定基预计算表, 之后 sG + tPA 完全不需要倍点
+# 内存: 普通上下文的奇数倍点表约 3 KB; 升级后的固定基预计算表约 180 KB, 建表约 20 ms,
+# 因此缓存对升级的上下文数单独设上限 (默认 1024 个上下文约 3 MB, 加 64 个升级上下文约 12 MB)
+
+PA_TABLE_WINDOW = 6          # 上下文中公钥奇数倍点表的窗口宽度 (表会被重复使用, 比一次性验签更宽)
+PA_COMB_WINDOW = 4           # 常用公钥固定基预计算表的窗口宽度 (64 个窗口, 约 1000 个点, 约 180 KB)
+HOT_VERIFIER_USES = 8        # 升级为固定基预计算表的验签次数
+VERIFIER_CACHE_SIZE = 1024   # 默认验签上下文缓存容量
+PROMOTED_VERIFIER_LIMIT = 64  # 默认缓存中持有固定基预计算表的上下文数上限
+
+
+class SM2Signer:
+    """绑定私钥和用户标识的签名上下文"""
+
+    def __init__(self, dA, ZA=b"DefaultID"):
+        """
+        :param dA: 私钥
+        :param ZA: 用户标识
+        """
+        if not 0 < dA < N - 1:
+            raise ValueError("Invalid private key")
+        self.dA = dA
+        self.ZA = ZA
+        self.za_hash = sm2_za(ZA)
+        self.d_inv = mod_inv(1 + dA, N)
+        self._public_key = None
+
+    @property
+    def public_key(self):
+        """公钥 PA = dA * G"""
+        if self._public_key is None:
+            self._public_key = fixed_base_mul(self.dA)
+        return self._public_key
+
+    def sign(self, msg):
+        """
+        签名
+        :param msg: 消息
+        :return: (r, s)
+        """
+        return _sign_digest(self.dA, self.d_inv, sm2_digest(self.za_hash, msg))
+
+
+class SM2Verifier:
+    """绑定公钥和用户标识的验签上下文"""
+
+    def __init__(self, PA, ZA=b"DefaultID", w=PA_TABLE_WINDOW, precompute=False, auto_promote=True):
+        """
+        :param PA: 公钥
+        :param ZA: 用户标识
+        :param w: 公钥奇数倍点表的窗口宽度
+        :param precompute: 立即构建固定基预计算表
+        :param auto_promote: 验签 HOT_VERIFIER_USES 次后自动构建固定基预计算表 (由 SM2VerifierCache 管理时关闭)
+        """
+        if PA.is_infinity() or not _is_on_curve(PA.x, PA.y):
+            raise ValueError("Invalid public key")
+        self.PA = PA
+        self.ZA = ZA
+        self.za_hash = sm2_za(ZA)
+        self.w = w
+        self.table = None
+        self.comb = None
+        self.uses = 0
+        self.auto_promote = auto_promote
+        if precompute:
+            self.precompute()
+        else:
+            self.table = odd_multiples(PA.x, PA.y, w)
+
+    def precompute(self):
+        """构建公钥的固定基预计算表"""
+        if self.comb is None:
+            self.comb = build_fixed_base_table(self.PA.x, self.PA.y, PA_COMB_WINDOW)
+            self.table = None
+
+    def demote(self):
+        """释放固定基预计算表, 退回奇数倍点表, 需要重新累计 HOT_VERIFIER_USES 次验签才会再次升级"""
+        if self.comb is not None:
+            self.comb = None
+            self.table = odd_multiples(self.PA.x, self.PA.y, self.w)
+        self.uses = 0
+
+    def verify(self, msg, signature):
+        """
+        验证签名
+        :param msg: 消息
+        :param signature: (r, s)
+        :return: 验证是否成功
+        """
+        self.uses += 1
+        if self.auto_promote and self.comb is None and self.uses >= HOT_VERIFIER_USES:
+            self.precompute()
+        return _verify_digest(sm2_digest(self.za_hash, msg), signature, self.table, self.w, self.comb)
+
+
+class SM2VerifierCache:
+    """
+    验签上下文的 LRU 缓存, 以 (压缩公钥, 用户标识) 为键
+    重复出现的签名者直接复用 Z_A 和公钥倍点表; 频繁出现的签名者升级为固定基预计算表,
+    升级的上下文另有一个 LRU, 超过 max_promoted 时最久未用的上下文降级释放大表
+    """
+
+    def __init__(self, capacity=VERIFIER_CACHE_SIZE, max_promoted=PROMOTED_VERIFIER_LIMIT):
+        """
+        :param capacity: 缓存的上下文数上限
+        :param max_promoted: 持有固定基预计算表 (每个约 180 KB) 的上下文数上限, 0 表示不升级
+        """
+        self.capacity = capacity
+        self.max_promoted = max_promoted
+        self._cache = OrderedDict()
+        self._promoted = OrderedDict()   # 已升级上下文的键, 按最近使用排序
+        self.hits = 0
+        self.misses = 0
+        self.promotions = 0
+        self.demotions = 0
+
+    def get(self, PA, ZA=b"DefaultID"):
+        """
+        取得 (PA, ZA) 的验签上下文, 不存在时创建
+        :return: SM2Verifier
+        """
+        key = (compress_pubkey(PA), ZA)
+        verifier = self._cache.get(key)
+        if verifier is not None and verifier.PA == PA:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return verifier
+
+        verifier = SM2Verifier(PA, ZA, auto_promote=False)
+        self._cache[key] = verifier
+        self._cache.move_to_end(key)
+        self.misses += 1
+        if len(self._cache) > self.capacity:
+            evicted, _ = self._cache.popitem(last=False)
+            self._promoted.pop(evicted, None)
+        return verifier
+
+    def _touch(self, verifier):
+        """记录一次使用, 达到 HOT_VERIFIER_USES 次时升级, 必要时降级最久未用的已升级上下文"""
+        key = (compress_pubkey(verifier.PA), verifier.ZA)
+        if verifier.comb is not None:
+            self._promoted.move_to_end(key)
+            return
+        if self.max_promoted <= 0 or verifier.uses + 1 < HOT_VERIFIER_USES:
+            return
+        while len(self._promoted) >= self.max_promoted:
+            old, _ = self._promoted.popitem(last=False)
+            self._cache[old].demote()
+            self.demotions += 1
+        verifier.precompute()
+        self._promoted[key] = None
+        self.promotions += 1
+
+    def verify(self, PA, msg, signature, ZA=b"DefaultID"):
+        """使用缓存的上下文验证签名"""
+        if PA.is_infinity() or not _is_on_curve(PA.x, PA.y):
+            return False
+        verifier = self.get(PA, ZA)
+        self._touch(verifier)
+        return verifier.verify(msg, signature)
+
+    def stats(self):
+        """缓存统计"""
+        return {"size": len(self._cache), "promoted": len(self._promoted), "hits": self.hits,
+                "misses": self.misses, "promotions": self.promotions, "demotions": self.demotions}
+
+
+_verifier_cache = SM2VerifierCache()
+
+
+def sm2_verify_cached(PA, msg, signature, ZA=b"DefaultID"):
+    """签名验证 (使用进程内共享的验签上下文缓存)"""
+    return _verifier_cache.verify(PA, msg, signature, ZA)
+
+
+
+# 批量验签
+# SM2 签名只含 x(R) mod n, 无法确定 R 的 y 坐标符号, 随机线性组合后合并成一次多标量乘法的做法不成立,
+# 批量验签改为共享各项都要做的工作:
+#   1. 相同用户标识的 Z_A 只算一次, 相同公钥的倍点表只建一次
+#   2. sG 全部查 G 的固定基预计算表; 批内重复出现的公钥拆成多段 PA_j = 2^(step*j) * PA,
+#      tPA 按段拆分标量后交错计算, 倍点链缩短为 step 位
+#   3. 所有分段基点和奇数倍点表各自合并, 整批只求两次逆 (Montgomery 同时求逆)
+#   4. 每项的结果停留在 Jacobian 坐标, 用 _x_matches 比较, 不再求逆
+# 每项单独判定, 返回值直接标出哪些签名无效
+
+BATCH_TABLE_WINDOW = 5                  # 批量验签中公钥各段奇数倍点表的窗口宽度
+BATCH_SPLITS = ((16, 8), (2, 4), (1, 1))  # (批内出现次数下限, 公钥拆分段数), 分段越多建表越贵、单次验签越快
+
+
+def _split_count(uses):
+    """批内出现 uses 次的公钥拆分的段数"""
+    for min_uses, parts in BATCH_SPLITS:
+        if uses >= min_uses:
+            return parts
+    return 1
+
+
+def sm2_verify_batch(items):
+    """
+    批量签名验证
+    :param items: [(PA, msg, signature, ZA), ...], ZA 可省略 (默认 b"DefaultID")
+    :return: 与 items 对应的验证结果列表
+    """
+    results = [False] * len(items)
+    za_hashes = {}
+    groups = {}     # (x, y) -> [(序号, e, r, s, t), ...]
+    for i, item in enumerate(items):
+        try:
+            PA, msg, (r, s) = item[0], item[1], item[2]
+            ZA = item[3] if len(item) > 3 else b"DefaultID"
+            if not (0 < r < N) or not (0 < s < N):
+                continue
+            t = (r + s) % N
+            if t == 0 or PA.is_infinity():
+                continue
+            key = (PA.x, PA.y)
+            if not (0 <= PA.x < P and 0 <= PA.y < P and _is_on_curve(PA.x, PA.y)):
+                continue
+            za_hash = za_hashes.get(ZA)
+            if za_hash is None:
+                za_hash = za_hashes[ZA] = sm2_za(ZA)
+            e = sm2_digest(za_hash, msg)
+        except (TypeError, ValueError, AttributeError, IndexError):
+            continue    # 格式错误的项判为无效, 不影响同批其他项
+        groups.setdefault(key, []).append((i, e, r, s, t))
+
+    # 各公钥的分段基点 2^(step*j) * PA, 合并后一次转换为仿射坐标
+    layout = []     # (公钥, 段数, 每段位数)
+    bases = []
+    for key, entries in groups.items():
+        x, y = key
+        parts = _split_count(len(entries))
+        step = (N.bit_length() + parts - 1) // parts
+        pt = (x, y, 1)
+        for j in range(parts):
+            bases.append(pt)
+            if j < parts - 1:
+                for _ in range(step):
+                    pt = jacobian_double(pt)
+        layout.append((key, parts, step))
+    bases = jacobian_batch_to_affine(bases)
+
+    # 所有分段的奇数倍点表, 合并后一次转换为仿射坐标
+    w = BATCH_TABLE_WINDOW
+    size = 1 << (w - 2)
+    points = []
+    for x, y in bases:
+        points.extend(odd_multiples_jacobian(x, y, w))
+    affine = jacobian_batch_to_affine(points)
+
+    offset = 0
+    for key, parts, step in layout:
+        tables = [affine[(offset + j) * size:(offset + j + 1) * size] for j in range(parts)]
+        offset += parts
+        mask = (1 << step) - 1
+        for i, e, r, s, t in groups[key]:
+            terms = [((t >> (step * j)) & mask, tables[j], w) for j in range(parts)]
+            point = jacobian_add(fixed_base_jacobian(s), multi_scalar_jacobian(terms))
+            results[i] = _x_matches(point, r, e)
+    return results
+
+
+
+# 多进程签名/验签服务
+# 纯 Python 大整数运算受 GIL 限制只能用一个核, 请求按块分发到进程池:
+# 每个工作进程启动时构建一次 G 的预计算表, 每块请求只需一次进程间通信, 验签块直接走 sm2_verify_batch
+
+SERVICE_CHUNK = 64   # 每块请求数
+
+
+def _worker_init():
+    """工作进程初始化: 预先构建 G 的预计算表 (配置了 SM2_G_TABLE_CACHE 时从磁盘读取)"""
+    get_g_table()
+    get_g_naf_table()
+
+
+def _sign_chunk(items):
+    """
+    工作进程: 签名一块请求, 同一 (私钥, 用户标识) 共用签名上下文
+    :param items: [(dA, msg, ZA), ...]
+    :return: [(r, s), ...], 出错的请求 (如私钥无效) 对应其异常对象, 不影响同一块的其他请求
+    """
+    signers = {}
+    signatures = []
+    for dA, msg, ZA in items:
+        try:
+            signer = signers.get((dA, ZA))
+            if signer is None:
+                signer = signers[(dA, ZA)] = SM2Signer(dA, ZA)
+            signatures.append(signer.sign(msg))
+        except Exception as exc:
+            signatures.append(exc)
+    return signatures
+
+
+def _verify_chunk(items):
+    """
+    工作进程: 验证一块请求
+    :param items: [(PA, msg, signature, ZA), ...]
+    :return: [bool, ...], 格式错误的请求判为无效, 不影响同一块的其他请求
+    """
+    try:
+        return sm2_verify_batch(items)
+    except Exception:
+        # 整批失败时逐项重试, 只让出错的那一项判为无效
+        results = []
+        for item in items:
+            try:
+                results.append(sm2_verify_batch([item])[0])
+            except Exception:
+                results.append(False)
+        return results
+
+
+class SM2WorkerPool:
+    """
+    多进程 SM2 签名/验签服务
+    同步接口 sign_many / verify_many 整批分块提交; 异步接口 await sign(...) / await verify(...)
+    把同一轮事件循环中到达的请求合并成块再提交
+    """
+
+    def __init__(self, workers=None, chunk_size=SERVICE_CHUNK):
+        """
+        :param workers: 工作进程数, 默认为 CPU 核数
+        :param chunk_size: 每块请求数
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_worker_init)
+        self._lock = threading.Lock()
+        self._pending = {_sign_chunk: [], _verify_chunk: []}   # 异步接口中尚未提交的请求
+        self._scheduled = set()
+        self._start = time.perf_counter()
+        self.submitted = 0        # 已接收的请求数
+        self.completed = 0        # 已完成的请求数
+        self.chunks = 0           # 已提交的块数
+        self.max_queue_depth = 0  # 未完成请求数的峰值
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """等待已提交的请求完成并关闭进程池"""
+        self._executor.shutdown(wait=True)
+
+    def _track(self, submitted=0, completed=0, chunks=0):
+        with self._lock:
+            self.submitted += submitted
+            self.completed += completed
+            self.chunks += chunks
+            self.max_queue_depth = max(self.max_queue_depth, self.submitted - self.completed)
+
+    def stats(self):
+        """
+        服务统计
+        :return: 请求数、队列深度 (已接收未完成的请求数) 和吞吐量 (每秒完成的请求数)
+        """
+        with self._lock:
+            elapsed = time.perf_counter() - self._start
+            return {
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "chunks": self.chunks,
+                "queue_depth": self.submitted - self.completed,
+                "max_queue_depth": self.max_queue_depth,
+                "throughput": self.completed / elapsed if elapsed else 0.0,
+            }
+
+    def _run(self, func, items):
+        """同步提交: 分块并行处理, 按原顺序返回结果"""
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        self._track(submitted=len(items), chunks=len(chunks))
+        results = []
+        try:
+            for part in self._executor.map(func, chunks):
+                results.extend(part)
+        finally:
+            self._track(completed=len(items))
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def sign_many(self, items):
+        """
+        批量签名
+        :param items: [(dA, msg) 或 (dA, msg, ZA), ...]
+        :return: [(r, s), ...]
+        """
+        return self._run(_sign_chunk, [(dA, msg, rest[0] if rest else b"DefaultID") for dA, msg, *rest in items])
+
+    def verify_many(self, items):
+        """
+        批量验签
+        :param items: [(PA, msg, signature) 或 (PA, msg, signature, ZA), ...]
+        :return: [bool, ...]
+        """
+        return self._run(_verify_chunk, [tuple(item) if len(item) > 3 else (*item, b"DefaultID") for item in items])
+
+    async def sign(self, dA, msg, ZA=b"DefaultID"):
+        """
+        异步签名, 返回 (r, s)
+        参数类型在入队前检查, 错误只影响本请求 (抛出 TypeError), 不会混进与其他调用者共用的块
+        """
+        if not isinstance(dA, int) or not isinstance(msg, (bytes, bytearray)) or not isinstance(ZA, (bytes, bytearray)):
+            raise TypeError("sign expects an int private key and bytes msg/ZA")
+        return await self._enqueue(_sign_chunk, (dA, bytes(msg), bytes(ZA)))
+
+    async def verify(self, PA, msg, signature, ZA=b"DefaultID"):
+        """
+        异步验签, 返回验证是否成功
+        格式错误的请求在入队前直接判为无效, 与 verify_many 一致
+        """
+        if not (isinstance(PA, ECPoint) and isinstance(PA.x, int) and isinstance(PA.y, int)
+                and isinstance(msg, (bytes, bytearray)) and isinstance(ZA, (bytes, bytearray))
+                and isinstance(signature, tuple) and len(signature) == 2
+                and all(isinstance(v, int) for v in signature)):
+            return False
+        return await self._enqueue(_verify_chunk, (ECPoint(PA.x, PA.y), bytes(msg), signature, bytes(ZA)))
+
+    def _enqueue(self, func, item):
+        """加入待提交队列, 攒满一块立即提交, 否则在本轮事件循环结束时提交"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending[func]
+        pending.append((item, future))
+        self._track(submitted=1)
+        if len(pending) >= self.chunk_size:
+            self._flush(func)
+        elif func not in self._scheduled:
+            self._scheduled.add(func)
+            loop.call_soon(self._flush, func)
+        return future
+
+    def _flush(self, func):
+        """把待提交队列作为一块提交到进程池"""
+        self._scheduled.discard(func)
+        batch = self._pending[func]
+        if not batch:
+            return
+        self._pending[func] = []
+        self._track(chunks=1)
+        loop = asyncio.get_running_loop()
+        done = loop.run_in_executor(self._executor, func, [item for item, _ in batch])
+        done.add_done_callback(lambda f: self._deliver(batch, f))
+
+    def _deliver(self, batch, done):
+        """把一块的结果分发给各请求的 future"""
+        self._track(completed=len(batch))
+        error = done.exception() if not done.cancelled() else asyncio.CancelledError()
+        results = done.result() if error is None else [None] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            elif isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
 
-def window_scalar_mul(k, P, w=4):
-    """窗口法优化标量乘法"""
-    table = [ECPoint(None, None)] * (1 << w)
-    table[0] = ECPoint(None, None)
-    table[1] = P
-    for i in range(2, 1 << w):
-        table[i] = table[i - 1] + P
-
-    result = ECPoint(None, None)
-    k_bits = bin(k)[2:]
-    total_bits = len(k_bits)
-
-    for i in range(0, total_bits, w):
-        end_idx = min(i + w, total_bits)
-        bits = k_bits[i:end_idx]
-        if not bits:
-            continue
 
-        idx = int(bits, 2)
-        result = result + table[idx]
 
-        if end_idx < total_bits:
-            for _ in range(len(bits)):
-                result = result + result
+# 性能优化技术
 
-    return result
+def window_scalar_mul(k, P, w=None):
+    """窗口法标量乘法 (wNAF 引擎, w 为窗口宽度, 默认按标量位数自动选择)"""
+    if k % N == 0 or P.is_infinity():
+        return ECPoint(None, None)
+    return jacobian_to_affine(wnaf_jacobian(k, P.x, P.y, w))
+
+
+def benchmark_naf_windows(bit_sizes=(32, 64, 128, 192, 256), windows=range(2, 8), rounds=20):
+    """
+    测量不同标量位数下各窗口宽度的 wNAF 标量乘法耗时
+    :return: [(位数, 自动选择的窗口, 实测最快的窗口, {窗口: 微秒}), ...]
+    """
+    Q = fixed_base_mul(bytes_to_int(os.urandom(32)) % (N - 1) + 1)
+    results = []
+    for bits in bit_sizes:
+        scalars = [bytes_to_int(os.urandom(32)) >> (256 - bits) | (1 << (bits - 1)) for _ in range(rounds)]
+        timings = {}
+        for w in windows:
+            start = time.perf_counter()
+            for k in scalars:
+                wnaf_jacobian(k, Q.x, Q.y, w)
+            timings[w] = (time.perf_counter() - start) / rounds * 1e6
+        best = min(timings, key=timings.get)
+        results.append((bits, choose_naf_window(bits), best, timings))
+    return results
 
 
 def compress_pubkey(P):
@@ -371,18 +1380,115 @@ def main():
     print_header("2. 性能优化")
 
     # 窗口法优化
-    print_subheader("窗口法标量乘法")
+    print_subheader("wNAF 窗口法标量乘法")
     k = 0x1234567890ABCDEF
     G_point = ECPoint(GX, GY)
-    result_std = k * G_point
+    result_std = G_point  # 仿射坐标二进制倍点-点加作为参照
+    for bit in bin(k)[3:]:
+        result_std = result_std + result_std
+        if bit == '1':
+            result_std = result_std + G_point
     result_opt = window_scalar_mul(k, G_point, 4)
     print_color("标准算法结果:", "1;34")
     print(result_std)
-    print_color("\n窗口法优化结果:", "1;34")
+    print_color("\nwNAF (w=4) 结果:", "1;34")
     print(result_opt)
     print_color(f"\n结果一致: {'是' if result_std == result_opt else '否'}",
                 "1;32" if result_std == result_opt else "1;31")
 
+    print_color("\n窗口宽度基准 (单位 us, * 为自动选择):", "1;34")
+    for bits, chosen, best, timings in benchmark_naf_windows():
+        cells = "  ".join(f"w={w}:{us:6.0f}{'*' if w == chosen else ' '}" for w, us in timings.items())
+        print(f"{bits:3d} 位  {cells}  实测最快 w={best}")
+
+    # 固定基预计算表
+    print_subheader("基点固定基预计算表")
+    start = time.perf_counter()
+    _build_g_table(G_TABLE_WINDOW)
+    build_ms = (time.perf_counter() - start) * 1000
+    k = bytes_to_int(os.urandom(32)) % N
+    start = time.perf_counter()
+    result_std = k * G_point
+    std_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    result_opt = fixed_base_mul(k)
+    opt_ms = (time.perf_counter() - start) * 1000
+    print_color(f"建表耗时: {build_ms:.2f} ms (窗口宽度 {G_TABLE_WINDOW})", "1;34")
+    print_color(f"通用标量乘法: {std_ms:.3f} ms, 查表法: {opt_ms:.3f} ms", "1;34")
+    print_color(f"结果一致: {'是' if result_std == result_opt else '否'}",
+                "1;32" if result_std == result_opt else "1;31")
+
+    # 签名/验签上下文
+    print_subheader("签名/验签上下文缓存")
+    signer = SM2Signer(private_key, b"ALICE123@YAHOO.COM")
+    messages = [f"消息 {i}".encode('utf-8') for i in range(20)]
+    signatures = [signer.sign(m) for m in messages]
+    start = time.perf_counter()
+    plain_ok = all(sm2_verify(public_key, m, sig, b"ALICE123@YAHOO.COM") for m, sig in zip(messages, signatures))
+    plain_ms = (time.perf_counter() - start) * 1000 / len(messages)
+    cached_ok = True
+    for _ in range(2):  # 第一轮包含建上下文和升级预计算表的开销, 取第二轮为稳定耗时
+        start = time.perf_counter()
+        cached_ok &= all(sm2_verify_cached(public_key, m, sig, b"ALICE123@YAHOO.COM") for m, sig in zip(messages, signatures))
+        cached_ms = (time.perf_counter() - start) * 1000 / len(messages)
+    print_color(f"逐次验签: {plain_ms:.3f} ms/次, 缓存上下文: {cached_ms:.3f} ms/次", "1;34")
+    print_color(f"缓存统计: {_verifier_cache.stats()}", "1;34")
+    print_color(f"结果一致: {'是' if plain_ok and cached_ok else '否'}",
+                "1;32" if plain_ok and cached_ok else "1;31")
+
+    # 批量验签
+    print_subheader("批量验签")
+    signers = [SM2Signer(sm2_key_gen()[0]) for _ in range(8)]
+    batch = []
+    for i in range(64):
+        signer = signers[i % len(signers)]
+        msg = f"交易 {i}".encode('utf-8')
+        batch.append((signer.public_key, msg, signer.sign(msg)))
+    r, s = batch[5][2]
+    batch[5] = (batch[5][0], batch[5][1], (r, (s + 1) % N))   # 篡改一个签名
+    start = time.perf_counter()
+    loop_results = [sm2_verify(PA, msg, sig) for PA, msg, sig in batch]
+    loop_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    batch_results = sm2_verify_batch(batch)
+    batch_ms = (time.perf_counter() - start) * 1000
+    print_color(f"64 个签名 (8 个签名者): 逐个验签 {loop_ms:.1f} ms, 批量验签 {batch_ms:.1f} ms", "1;34")
+    print_color(f"无效签名位置: {[i for i, ok in enumerate(batch_results) if not ok]}", "1;34")
+    print_color(f"结果一致: {'是' if loop_results == batch_results else '否'}",
+                "1;32" if loop_results == batch_results else "1;31")
+
+    # 批量密钥生成
+    print_subheader("批量密钥生成")
+    start = time.perf_counter()
+    loop_keys = [compress_pubkey(sm2_key_gen()[1]) for _ in range(256)]
+    loop_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    batch_keys = sm2_key_gen_batch(256)
+    batch_ms = (time.perf_counter() - start) * 1000
+    keys_ok = all(compress_pubkey(fixed_base_mul(dA)) == pub for dA, pub in batch_keys[:8])
+    print_color(f"256 个密钥对: 逐个生成 {loop_ms:.1f} ms, 批量生成 {batch_ms:.1f} ms", "1;34")
+    print_color(f"抽查公钥: {'一致' if keys_ok else '不一致'}", "1;32" if keys_ok else "1;31")
+
+    # 多进程服务
+    print_subheader("多进程签名/验签服务")
+    requests = [(private_key, f"请求 {i}".encode('utf-8')) for i in range(128)]
+    with SM2WorkerPool(chunk_size=32) as pool:
+        start = time.perf_counter()
+        service_sigs = pool.sign_many(requests)
+        service_ok = all(pool.verify_many([(public_key, msg, sig) for (_, msg), sig in zip(requests, service_sigs)]))
+        service_ms = (time.perf_counter() - start) * 1000
+
+        async def serve():
+            sigs = await asyncio.gather(*(pool.sign(dA, msg) for dA, msg in requests[:32]))
+            return await asyncio.gather(*(pool.verify(public_key, msg, sig) for (_, msg), sig in zip(requests, sigs)))
+
+        service_ok &= all(asyncio.run(serve()))
+        stats = pool.stats()
+    print_color(f"工作进程: {stats['workers']}, 128 次签名 + 128 次验签: {service_ms:.1f} ms", "1;34")
+    print_color(f"请求数: {stats['completed']}, 块数: {stats['chunks']}, 队列深度峰值: {stats['max_queue_depth']}, "
+                f"吞吐量: {stats['throughput']:.0f} 次/秒", "1;34")
+    print_color(f"结果正确: {'是' if service_ok else '否'}", "1;32" if service_ok else "1;31")
+
     # 公钥压缩
     print_subheader("公钥压缩技术")
     compressed = compress_pubkey(public_key)